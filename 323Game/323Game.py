@@ -3,6 +3,12 @@ import random
 import pygame
 import os
 import pytmx
+import weakref
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+from collections import OrderedDict
 
 # Initialize pygame
 pygame.init()
@@ -10,10 +16,15 @@ pygame.init()
 # Game constants
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
-FPS = 60
+FPS = 60 # render rate cap, the simulation runs at SIM_RATE regardless
+SIM_RATE = 120
+SIM_DT = 1 / SIM_RATE
+MAX_SIM_STEPS = 12 # catch-up steps per frame before the backlog is dropped
 PLAYER_SPEED = 150 # change for testing
 WORLD_WIDTH = 3000
 WORLD_HEIGHT = 3000
+LOGICAL_RENDER = True # draw the world at 1x and upscale it once per frame
+DEBUG = False # print map load reports to the console
 
 # Colors
 BLACK = (0, 0, 0)
@@ -29,6 +40,35 @@ screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Lone Voyager")
 clock = pygame.time.Clock()
 
+class DirtyRects:
+    # Screen areas changed since the last present(). Widgets mark what they
+    # draw and present() pushes just those areas, falling back to a flip when
+    # the whole frame changed
+    def __init__(self, surface):
+        self.surface = surface
+        self.rects = []
+        self.full = False
+
+    def mark(self, surface, rect):
+        # Drawing onto other surfaces (sprite images, render targets) is ignored
+        if surface is self.surface and not self.full:
+            self.rects.append(pygame.Rect(rect))
+        return rect
+
+    def mark_full(self):
+        self.full = True
+        self.rects.clear()
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects.clear()
+        self.full = False
+
+dirty_rects = DirtyRects(screen)
+
 class Camera:
     def __init__(self, width, height, zoom=1):
         self.camera = pygame.Rect(0, 0, width, height)
@@ -36,70 +76,389 @@ class Camera:
         self.height = height
         self.zoom = zoom
 
-    def apply(self, entity):
+    def apply(self, entity, zoom=None):
+        zoom = self.zoom if zoom is None else zoom
         return pygame.Rect(
-            (entity.rect.x - self.camera.x) * self.zoom,
-            (entity.rect.y - self.camera.y) * self.zoom,
-            entity.rect.width * self.zoom,
-            entity.rect.height * self.zoom
+            (entity.rect.x - self.camera.x) * zoom,
+            (entity.rect.y - self.camera.y) * zoom,
+            entity.rect.width * zoom,
+            entity.rect.height * zoom
         ).topleft  # Only need position for blit
 
-    def apply_rect(self, rect):
+    def apply_rect(self, rect, zoom=None):
+        zoom = self.zoom if zoom is None else zoom
         return pygame.Rect(
-            (rect.x - self.camera.x) * self.zoom,
-            (rect.y - self.camera.y) * self.zoom,
-            rect.width * self.zoom,
-            rect.height * self.zoom
+            (rect.x - self.camera.x) * zoom,
+            (rect.y - self.camera.y) * zoom,
+            rect.width * zoom,
+            rect.height * zoom
         )
 
-    def update(self, target):
-        x = -target.rect.centerx + SCREEN_WIDTH / (2 * self.zoom)
-        y = -target.rect.centery + SCREEN_HEIGHT / (2 * self.zoom)
+    def update(self, target, alpha=None):
+        # With alpha, follow the target's interpolated render position
+        rect = target.rect if alpha is None else target.interpolated_rect(alpha)
+        x = -rect.centerx + SCREEN_WIDTH / (2 * self.zoom)
+        y = -rect.centery + SCREEN_HEIGHT / (2 * self.zoom)
         self.camera = pygame.Rect(-x, -y, self.width, self.height)
 
+    def view_rect(self):
+        # The part of the world that is on screen
+        return pygame.Rect(self.camera.x, self.camera.y,
+                           math.ceil(SCREEN_WIDTH / self.zoom), math.ceil(SCREEN_HEIGHT / self.zoom))
+
+class TextCache:
+    # Fonts are loaded once per (face, size) and rendered text is kept in an
+    # LRU keyed by (text, font, color, antialias). Cached surfaces are shared,
+    # so callers must not draw into them
+    def __init__(self, max_surfaces=256):
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.max_surfaces = max_surfaces
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, face, size):
+        key = (face, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.Font(face, size)
+        return font
+
+    def render(self, text, font, color, antialias=False):
+        key = (text, font, tuple(color), antialias)
+        text_surface = self.surfaces.get(key)
+        if text_surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return text_surface
+
+        self.misses += 1
+        text_surface = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return text_surface
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0
+        return (f"Text cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"{len(self.surfaces)} surfaces, {len(self.fonts)} fonts")
+
+text_cache = TextCache()
+
 # Load pixel font
-pixel_font13 = pygame.font.Font("PressStart2P-Regular.ttf", 13)
-pixel_font16 = pygame.font.Font("PressStart2P-Regular.ttf", 16)
-pixel_font24 = pygame.font.Font("PressStart2P-Regular.ttf", 24)
-pixel_font36 = pygame.font.Font("PressStart2P-Regular.ttf", 36)
-pixel_font64 = pygame.font.Font("PressStart2P-Regular.ttf", 64)
+pixel_font13 = text_cache.font("PressStart2P-Regular.ttf", 13)
+pixel_font16 = text_cache.font("PressStart2P-Regular.ttf", 16)
+pixel_font24 = text_cache.font("PressStart2P-Regular.ttf", 24)
+pixel_font36 = text_cache.font("PressStart2P-Regular.ttf", 36)
+pixel_font64 = text_cache.font("PressStart2P-Regular.ttf", 64)
 
 def draw_text(surface, text, size, color, x, y, font=None):
     if font is None:
-        font = pygame.font.Font(None, size) # Fallback
-    text_surface = font.render(text, False, color)
+        font = text_cache.font(None, size) # Fallback
+    text_surface = text_cache.render(text, font, color)
     text_rect = text_surface.get_rect(center=(x, y))
     surface.blit(text_surface, text_rect)
+    return dirty_rects.mark(surface, text_rect)
+
+class EffectSurfaces:
+    # Screen effect surfaces built once and reused: full-screen dimming
+    # overlays keyed by alpha, and the suspicion border quantized into a fixed
+    # number of intensity steps. The border used to be blended twice a frame
+    # at alpha 150; 211 gives the same color in one pass
+    def __init__(self, border_steps=20, max_border_size=10, max_border_alpha=211):
+        self.overlays = {}
+        self.borders = {}
+        self.border_steps = border_steps
+        self.max_border_size = max_border_size
+        self.max_border_alpha = max_border_alpha
+
+    def overlay(self, alpha=180):
+        overlay = self.overlays.get(alpha)
+        if overlay is None:
+            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+            overlay.fill((0, 0, 0, alpha))
+            self.overlays[alpha] = overlay
+        return overlay
+
+    def suspicion_border(self, intensity):
+        # Returns (image, dest) pairs for the four border strips, or an empty
+        # list when the border is too thin to show
+        step = min(self.border_steps, int(intensity * self.border_steps))
+        pieces = self.borders.get(step)
+        if pieces is None:
+            intensity = step / self.border_steps
+            size = int(self.max_border_size * intensity)
+            pieces = []
+            if size > 0:
+                color = (255, 0, 0, int(self.max_border_alpha * intensity))
+                horizontal = pygame.Surface((SCREEN_WIDTH, size), pygame.SRCALPHA)
+                horizontal.fill(color)
+                # The side strips stop short of the top and bottom strips so
+                # the corners are not blended twice
+                vertical = pygame.Surface((size, SCREEN_HEIGHT - 2 * size), pygame.SRCALPHA)
+                vertical.fill(color)
+                pieces = [(horizontal, (0, 0)),
+                          (horizontal, (0, SCREEN_HEIGHT - size)),
+                          (vertical, (0, size)),
+                          (vertical, (SCREEN_WIDTH - size, size))]
+            self.borders[step] = pieces
+        return pieces
+
+effect_surfaces = EffectSurfaces()
+
+class TileIndex:
+    # Load-time index of the non-empty tiles of every visible tile layer,
+    # bucketed into bucket_size x bucket_size blocks of cells. Each bucket keeps
+    # its tiles in layer order so overlapping tiles still draw correctly
+    def __init__(self, tmx_data, bucket_size=16):
+        self.width = tmx_data.width
+        self.height = tmx_data.height
+        self.bucket_size = bucket_size
+        self.buckets = {}
+        for layer in tmx_data.visible_layers:
+            if isinstance(layer, pytmx.TiledTileLayer):
+                for y, row in enumerate(layer.data):
+                    for x, gid in enumerate(row):
+                        if gid:
+                            key = (x // bucket_size, y // bucket_size)
+                            self.buckets.setdefault(key, []).append((x, y, gid))
+
+    def tiles_in(self, x0, y0, x1, y1):
+        # Yields (x, y, gid) for the cells with x0 <= x < x1 and y0 <= y < y1
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width, x1), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        size = self.bucket_size
+        for by in range(y0 // size, (y1 - 1) // size + 1):
+            for bx in range(x0 // size, (x1 - 1) // size + 1):
+                bucket = self.buckets.get((bx, by))
+                if not bucket:
+                    continue
+                inside = (x0 <= bx * size and (bx + 1) * size <= x1 and
+                          y0 <= by * size and (by + 1) * size <= y1)
+                for tile in bucket:
+                    if inside or (x0 <= tile[0] < x1 and y0 <= tile[1] < y1):
+                        yield tile
+
+class TileCache:
+    # Scaled tile images keyed by (gid, zoom). Each gid is scaled once per zoom
+    # and whole zoom levels are evicted least recently used first once the
+    # cache grows past max_bytes
+    def __init__(self, tmx_data, max_bytes=16 * 1024 * 1024):
+        self.tmx_data = tmx_data
+        self.max_bytes = max_bytes
+        self.levels = OrderedDict()
+        self.level_bytes = {}
+        self.total_bytes = 0
+
+    def get(self, gid, zoom):
+        level = self.levels.get(zoom)
+        if level is None:
+            level = self.levels[zoom] = {}
+            self.level_bytes[zoom] = 0
+        else:
+            self.levels.move_to_end(zoom)
+
+        if gid in level:
+            return level[gid]
+
+        scaled_tile = None
+        tile = self.tmx_data.get_tile_image_by_gid(gid)
+        if tile:
+            scaled_tile = pygame.transform.scale(
+                tile,
+                (int(self.tmx_data.tilewidth * zoom), int(self.tmx_data.tileheight * zoom))
+            )
+            size = scaled_tile.get_width() * scaled_tile.get_height() * scaled_tile.get_bytesize()
+            self.level_bytes[zoom] += size
+            self.total_bytes += size
+        level[gid] = scaled_tile
+
+        # Never evict the level that is currently being drawn
+        while self.total_bytes > self.max_bytes and len(self.levels) > 1:
+            old_zoom, _ = self.levels.popitem(last=False)
+            self.total_bytes -= self.level_bytes.pop(old_zoom)
+        return scaled_tile
+
+class MapRenderer:
+    # Bakes the tile layers into chunk surfaces at the camera zoom so a frame
+    # only has to blit the handful of chunks that overlap the viewport. Baked
+    # chunks are kept least recently used first up to max_bytes, the same
+    # way TileCache caps its levels; 32 MB holds the view plus a ring of
+    # chunks around it at zoom 3 (about 2.4 MB a chunk) and the whole map
+    # at zoom 1. The chunks on screen are never evicted
+    def __init__(self, tmx_data, tile_cache=None, tile_index=None, chunk_size=32,
+                 max_bytes=32 * 1024 * 1024):
+        self.tmx_data = tmx_data
+        self.tile_cache = tile_cache if tile_cache else TileCache(tmx_data)
+        self.tile_index = tile_index if tile_index else TileIndex(tmx_data)
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.visible_count = 0
+        self.chunk_world_w = chunk_size * tmx_data.tilewidth
+        self.chunk_world_h = chunk_size * tmx_data.tileheight
+        self.cols = -(-tmx_data.width // chunk_size)
+        self.rows = -(-tmx_data.height // chunk_size)
+        self.zoom = None
+        self.chunks = OrderedDict()
+
+    def set_zoom(self, zoom):
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.chunks.clear()
+            self.total_bytes = 0
+
+    def bake_chunk(self, cx, cy):
+        tmx_data = self.tmx_data
+        tile_cache = self.tile_cache
+        tile_w = int(tmx_data.tilewidth * self.zoom)
+        tile_h = int(tmx_data.tileheight * self.zoom)
+        x0 = cx * self.chunk_size
+        y0 = cy * self.chunk_size
+        x1 = min(x0 + self.chunk_size, tmx_data.width)
+        y1 = min(y0 + self.chunk_size, tmx_data.height)
+
+        chunk = pygame.Surface(((x1 - x0) * tile_w, (y1 - y0) * tile_h)).convert()
+        chunk.fill(BLACK)
+        empty = True
+        for x, y, gid in self.tile_index.tiles_in(x0, y0, x1, y1):
+            scaled_tile = tile_cache.get(gid, self.zoom)
+            if scaled_tile:
+                chunk.blit(scaled_tile, ((x - x0) * tile_w, (y - y0) * tile_h))
+                empty = False
+        # Empty chunks are remembered as None so they are never baked again
+        return None if empty else chunk
+
+    def get_chunk(self, cx, cy):
+        key = (cx, cy)
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        chunk = self.bake_chunk(cx, cy)
+        self.chunks[key] = chunk
+        self.total_bytes += self.chunk_bytes(chunk)
+        while self.total_bytes > self.max_bytes and len(self.chunks) > self.visible_count:
+            _, evicted = self.chunks.popitem(last=False)
+            self.total_bytes -= self.chunk_bytes(evicted)
+        return chunk
+
+    @staticmethod
+    def chunk_bytes(chunk):
+        # Empty chunks are stored as None and cost nothing
+        if chunk is None:
+            return 0
+        return chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+
+    def draw(self, surface, camera, zoom=None):
+        self.set_zoom(camera.zoom if zoom is None else zoom)
+        zoom = self.zoom
+        view_w = surface.get_width() / zoom
+        view_h = surface.get_height() / zoom
+
+        first_cx = max(0, int(camera.camera.x // self.chunk_world_w))
+        first_cy = max(0, int(camera.camera.y // self.chunk_world_h))
+        last_cx = min(self.cols - 1, int((camera.camera.x + view_w) // self.chunk_world_w))
+        last_cy = min(self.rows - 1, int((camera.camera.y + view_h) // self.chunk_world_h))
+        self.visible_count = max(0, last_cx - first_cx + 1) * max(0, last_cy - first_cy + 1)
+
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                chunk = self.get_chunk(cx, cy)
+                if chunk:
+                    screen_x = (cx * self.chunk_world_w - camera.camera.x) * zoom
+                    screen_y = (cy * self.chunk_world_h - camera.camera.y) * zoom
+                    surface.blit(chunk, (screen_x, screen_y))
+
+class SpriteImageCache:
+    # Scaled copies of sprite images keyed by (source surface, zoom). Entries go
+    # away with their source surface. Sprite frames are shared between sprites
+    # and never drawn into, so a cached copy cannot go stale
+    def __init__(self):
+        self.images = weakref.WeakKeyDictionary()
 
-def draw_map(surface, tmx_data, camera, zoom=1):
-    for layer in tmx_data.visible_layers:
-        if isinstance(layer, pytmx.TiledTileLayer):
-            for x, y, gid in layer:
-                tile = tmx_data.get_tile_image_by_gid(gid)
-                if tile:
-                    # Scale the tile based on zoom
-                    scaled_tile = pygame.transform.scale(
-                        tile,
-                        (int(tmx_data.tilewidth * zoom), int(tmx_data.tileheight * zoom))
-                    )
+    def get(self, image, zoom):
+        if zoom == 1:
+            return image
+        scaled = self.images.get(image)
+        if scaled is None:
+            scaled = self.images[image] = {}
+        scaled_image = scaled.get(zoom)
+        if scaled_image is None:
+            scaled_image = scaled[zoom] = pygame.transform.scale(
+                image,
+                (int(image.get_width() * zoom), int(image.get_height() * zoom))
+            )
+        return scaled_image
 
-                    # Calculate world position
-                    world_x = x * tmx_data.tilewidth
-                    world_y = y * tmx_data.tileheight
+sprite_image_cache = SpriteImageCache()
 
-                    # Apply camera and zoom
-                    screen_x = (world_x - camera.camera.x) * zoom
-                    screen_y = (world_y - camera.camera.y) * zoom
+class RenderQueue:
+    # Collects (image, dest) pairs and submits them in a single blits call,
+    # ordered by rect.bottom so sprites lower on screen overlap higher ones
+    def __init__(self):
+        self.items = []
+
+    def add(self, image, dest, depth):
+        self.items.append((depth, image, dest))
+
+    def flush(self, surface):
+        # Stable sort, so equal depths keep their insertion order
+        self.items.sort(key=lambda item: item[0])
+        blits = getattr(surface, "fblits", None)
+        if blits:
+            blits([(image, dest) for _, image, dest in self.items])
+        else:
+            surface.blits([(image, dest) for _, image, dest in self.items], False)
+        self.items.clear()
+
+def draw_sprites(surface, sprites, camera, zoom, queue=None, alpha=None):
+    # With alpha, moving sprites are drawn between their last two simulation states
+    if queue is None:
+        queue = RenderQueue()
+    view = surface.get_rect()
+    for entity in sprites:
+        rect = entity.rect
+        if alpha is not None and hasattr(entity, "interpolated_rect"):
+            rect = entity.interpolated_rect(alpha)
+        dest = camera.apply_rect(rect, zoom)
+        # Skip anything that does not overlap the view
+        if not view.colliderect(dest):
+            continue
+        image = sprite_image_cache.get(entity.image, zoom)
+        queue.add(image, dest.topleft, rect.bottom)
+    queue.flush(surface)
 
-                    surface.blit(scaled_tile, (screen_x, screen_y))
+class WorldRenderer:
+    # Render target for drawing the world at native 1x resolution. The finished
+    # frame is upscaled onto the screen with a single integer nearest-neighbour
+    # scale, so pixel art looks the same as scaling every tile and sprite
+    def __init__(self, zoom):
+        self.zoom = int(zoom)
+        width = -(-SCREEN_WIDTH // self.zoom)
+        height = -(-SCREEN_HEIGHT // self.zoom)
+        self.surface = pygame.Surface((width, height)).convert()
+        self.scaled = pygame.Surface((width * self.zoom, height * self.zoom)).convert()
+
+    def begin(self):
+        self.surface.fill(BLACK)
+        return self.surface
+
+    def present(self, screen):
+        pygame.transform.scale(self.surface, self.scaled.get_size(), self.scaled)
+        screen.blit(self.scaled, (0, 0))
 
 def show_start_screen():
     screen.fill(BLACK)
+    dirty_rects.mark_full()
     draw_text(screen, "LONE VOYAGER", 64, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, font=pixel_font64)
     draw_text(screen, "WASD or Arrow Keys to Move", 36, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, font=pixel_font36)
     draw_text(screen, "Press O to Interact with Objects", 36, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50, font=pixel_font36)
     draw_text(screen, "Press Any Key to Begin", 36, RED, SCREEN_WIDTH // 2, SCREEN_HEIGHT * 3/4, font=pixel_font36)
-    pygame.display.flip()
+    dirty_rects.present()
     
     waiting = True
     while waiting:
@@ -114,9 +473,10 @@ def show_start_screen():
 
 def show_game_over_screen():
     screen.fill(BLACK)
+    dirty_rects.mark_full()
     draw_text(screen, "GAME OVER", 64, RED, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, font=pixel_font64)
     draw_text(screen, "Press Any Key to Play Again", 36, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, font=pixel_font36)
-    pygame.display.flip()
+    dirty_rects.present()
     
     waiting = True
     while waiting:
@@ -130,12 +490,9 @@ def show_game_over_screen():
     return True
 
 def show_message_screen(message):
-    # Create a semi-transparent overlay
-    overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 180))  # Semi-transparent black
-    
-    # Draw the overlay
-    screen.blit(overlay, (0, 0))
+    # Draw a semi-transparent overlay
+    screen.blit(effect_surfaces.overlay(180), (0, 0))
+    dirty_rects.mark_full()
     
     # Draw message box
     message_rect = pygame.Rect(SCREEN_WIDTH // 4, SCREEN_HEIGHT // 3, 
@@ -144,7 +501,7 @@ def show_message_screen(message):
     pygame.draw.rect(screen, BLACK, message_rect, 2)
     
     # Split message into lines that fit in the box
-    font = pygame.font.Font(None, 36)
+    font = text_cache.font(None, 36)
     words = message.split(' ')
     lines = []
     current_line = []
@@ -168,7 +525,7 @@ def show_message_screen(message):
     # Draw instruction to continue
     draw_text(screen, "Press ENTER to continue", 24, BLACK, SCREEN_WIDTH // 2, message_rect.bottom - 40, font=pixel_font24)
     
-    pygame.display.flip()
+    dirty_rects.present()
     
     waiting = True
     while waiting:
@@ -184,6 +541,11 @@ def show_message_screen(message):
 def show_code_input_screen():
     code = ""
     input_active = True
+
+    # Dim the game once, after that only the input box is redrawn
+    screen.blit(effect_surfaces.overlay(180), (0, 0))
+    dirty_rects.mark_full()
+    redraw = True
     
     while input_active:
         for event in pygame.event.get():
@@ -198,31 +560,32 @@ def show_code_input_screen():
                     return False, False
                 elif event.key == pygame.K_BACKSPACE:
                     code = code[:-1]
+                    redraw = True
                 elif event.unicode.isdigit() and len(code) < 4:
                     code += event.unicode
+                    redraw = True
         
         # Draw the screen
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        screen.blit(overlay, (0, 0))
-        
-        input_rect = pygame.Rect(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 50, 300, 100)
-        pygame.draw.rect(screen, WHITE, input_rect)
-        pygame.draw.rect(screen, BLACK, input_rect, 2)
-        
-        # Display asterisks instead of numbers
-        display_code = "*" * len(code)
-        draw_text(screen, "Enter 4-digit code:", 36, BLACK, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 80)
-        draw_text(screen, display_code, 48, BLACK, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-        draw_text(screen, "Press ENTER to submit", 24, BLACK, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60)
+        if redraw:
+            input_rect = pygame.Rect(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 50, 300, 100)
+            pygame.draw.rect(screen, WHITE, input_rect)
+            pygame.draw.rect(screen, BLACK, input_rect, 2)
+            dirty_rects.mark(screen, input_rect)
+            
+            # Display asterisks instead of numbers
+            display_code = "*" * len(code)
+            draw_text(screen, "Enter 4-digit code:", 36, BLACK, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 80)
+            draw_text(screen, display_code, 48, BLACK, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+            draw_text(screen, "Press ENTER to submit", 24, BLACK, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60)
+            redraw = False
         
-        pygame.display.flip()
+        dirty_rects.present()
         clock.tick(FPS)
     
     return True, code == "8514"
 
 class WheelCipher:
-    def __init__(self):
+    def __init__(self, max_cached_angles=4):
         self.radius = 200
         self.center_x = SCREEN_WIDTH // 2
         self.center_y = SCREEN_HEIGHT // 2
@@ -231,47 +594,74 @@ class WheelCipher:
         self.rotation_speed = 2
         self.outer_letters = "ABCDEFGHIJKLMNO"
         self.inner_numbers = [str(i) for i in range(1, 16)]
+
+        # The rings are rendered once; the letter ring is rotated on demand and
+        # the rotations are cached per rotation_speed step. A held wheel needs
+        # one entry and a turning one misses anyway, so only the last few
+        # angles are kept (about 650 KB each) for when the player turns back
+        self.ring_size = self.radius * 2 + 4
+        self.letter_ring = self.build_ring(self.outer_letters, self.radius - 20, WHITE)
+        self.number_ring = self.build_ring(self.inner_numbers, self.radius // 2 - 20, GREEN)
+        ring_center = (self.ring_size // 2, self.ring_size // 2)
+        pygame.draw.circle(self.number_ring, WHITE, ring_center, self.radius, 2)
+        pygame.draw.circle(self.number_ring, WHITE, ring_center, self.radius // 2, 2)
+        self.ring_rect = self.number_ring.get_rect(center=(self.center_x, self.center_y))
+        self.rotated_rings = OrderedDict()
+        self.max_cached_angles = max_cached_angles
+
+        # The "4" never moves, so its indicator end point is fixed
+        self.number_marker = self.ring_point(self.inner_numbers.index("4"), len(self.inner_numbers),
+                                             0, self.radius // 2 - 20)
+
+    def ring_point(self, index, count, angle_offset, distance):
+        angle = math.radians(angle_offset + index * (360 / count))
+        return (self.center_x + distance * math.cos(angle),
+                self.center_y + distance * math.sin(angle))
+
+    def build_ring(self, labels, distance, color):
+        ring = pygame.Surface((self.ring_size, self.ring_size), pygame.SRCALPHA)
+        half = self.ring_size // 2
+        for i, label in enumerate(labels):
+            angle = math.radians(i * (360 / len(labels)))
+            draw_text(ring, label, 30, color,
+                      half + distance * math.cos(angle), half + distance * math.sin(angle))
+        return ring
+
+    def rotated_letter_ring(self, angle):
+        ring = self.rotated_rings.get(angle)
+        if ring is not None:
+            self.rotated_rings.move_to_end(angle)
+            return ring
+
+        # pygame rotates counterclockwise, the wheel angle runs clockwise on screen.
+        # Crop back to the ring size, everything outside it is empty
+        rotated = pygame.transform.rotate(self.letter_ring, -angle)
+        crop = self.letter_ring.get_rect(center=rotated.get_rect().center)
+        ring = rotated.subsurface(crop).copy()
+        self.rotated_rings[angle] = ring
+        if len(self.rotated_rings) > self.max_cached_angles:
+            self.rotated_rings.popitem(last=False)
+        return ring
         
     def draw(self, surface, suspicion_level):
         if not self.visible:
             return
             
         # Draw semi-transparent background
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        surface.blit(overlay, (0, 0))
-        
-        # Draw outer circle (letters)
-        pygame.draw.circle(surface, WHITE, (self.center_x, self.center_y), self.radius, 2)
-        
-        # Draw inner circle (numbers)
-        pygame.draw.circle(surface, WHITE, (self.center_x, self.center_y), self.radius // 2, 2)
-        
-        # Draw outer letters
-        for i, letter in enumerate(self.outer_letters):
-            angle = math.radians(self.outer_angle + i * (360 / len(self.outer_letters)))
-            x = self.center_x + (self.radius - 20) * math.cos(angle)
-            y = self.center_y + (self.radius - 20) * math.sin(angle)
-            draw_text(surface, letter, 30, WHITE, x, y)
-            
-            # Draw red indicator at K when suspicion is high
-            if suspicion_level > 80 and letter == "K":
-                pygame.draw.line(surface, RED, 
-                               (self.center_x, self.center_y),
-                               (x, y), 2)
-        
-        # Draw inner numbers
-        for i, number in enumerate(self.inner_numbers):
-            angle = math.radians(i * (360 / len(self.inner_numbers)))
-            x = self.center_x + (self.radius // 2 - 20) * math.cos(angle)
-            y = self.center_y + (self.radius // 2 - 20) * math.sin(angle)
-            draw_text(surface, number, 30, GREEN, x, y)
-            
-            # Draw red indicator at 4 when suspicion is high
-            if suspicion_level > 80 and number == "4":
-                pygame.draw.line(surface, RED, 
-                               (self.center_x, self.center_y),
-                               (x, y), 2)
+        surface.blit(effect_surfaces.overlay(180), (0, 0))
+        dirty_rects.mark_full()
+
+        # Draw both circles with the inner numbers, then the rotated letters
+        angle = round(self.outer_angle / self.rotation_speed) * self.rotation_speed % 360
+        surface.blits([(self.number_ring, self.ring_rect),
+                       (self.rotated_letter_ring(angle), self.ring_rect)], False)
+
+        # Draw red indicators at K and 4 when suspicion is high
+        if suspicion_level > 80:
+            letter_marker = self.ring_point(self.outer_letters.index("K"), len(self.outer_letters),
+                                            angle, self.radius - 20)
+            pygame.draw.line(surface, RED, (self.center_x, self.center_y), letter_marker, 2)
+            pygame.draw.line(surface, RED, (self.center_x, self.center_y), self.number_marker, 2)
         
         # Draw center pin
         pygame.draw.circle(surface, RED, (self.center_x, self.center_y), 10)
@@ -323,18 +713,8 @@ class SuspicionSystem:
             intensity = min(1.0, (self.suspicion - self.high_suspicion_threshold) / 
                         (self.max_suspicion - self.high_suspicion_threshold))
             
-            border_size = int(10 * intensity)
-            if border_size > 0:
-                border = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                pygame.draw.rect(border, (255, 0, 0, int(150 * intensity)), 
-                                (0, 0, SCREEN_WIDTH, border_size))
-                pygame.draw.rect(border, (255, 0, 0, int(150 * intensity)), 
-                                (0, SCREEN_HEIGHT - border_size, SCREEN_WIDTH, border_size))
-                pygame.draw.rect(border, (255, 0, 0, int(150 * intensity)), 
-                                (0, 0, border_size, SCREEN_HEIGHT))
-                pygame.draw.rect(border, (255, 0, 0, int(150 * intensity)), 
-                                (SCREEN_WIDTH - border_size, 0, border_size, SCREEN_HEIGHT))
-                surface.blit(border, (0, 0))
+            for image, dest in effect_surfaces.suspicion_border(intensity):
+                dirty_rects.mark(surface, surface.blit(image, dest))
         
         meter_width = 200
         meter_height = 20
@@ -345,17 +725,553 @@ class SuspicionSystem:
         pygame.draw.rect(surface, (255, 0, 0), 
                         (meter_x, meter_y, meter_width * (self.suspicion / self.max_suspicion), meter_height))
         pygame.draw.rect(surface, WHITE, (meter_x, meter_y, meter_width, meter_height), 2)
+        dirty_rects.mark(surface, (meter_x, meter_y, meter_width, meter_height))
         
-        font = pygame.font.Font(None, 24)
-        text = font.render("SUSPICION", True, WHITE)
-        surface.blit(text, (meter_x, meter_y - 25))
+        font = text_cache.font(None, 24)
+        text = text_cache.render("SUSPICION", font, WHITE, True)
+        dirty_rects.mark(surface, surface.blit(text, (meter_x, meter_y - 25)))
 
-class Wall(pygame.sprite.Sprite):
-    def __init__(self, x, y, width, height):
-        super().__init__()
-        self.image = pygame.Surface((width, height))
-        self.image.fill(BLUE)
-        self.rect = self.image.get_rect(topleft=(x, y))
+class StaticSpatialHash:
+    # Uniform grid over things that never move. Each item is stored in every
+    # cell its rect touches, so a query only looks at the cells it covers
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        return (int(rect.left // size), int(rect.top // size),
+                int((rect.right - 1) // size), int((rect.bottom - 1) // size))
+
+    def insert(self, item, rect):
+        x0, y0, x1, y1 = self.cell_range(rect)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                self.cells.setdefault((cx, cy), []).append((item, rect))
+
+    def collide(self, rect, area=None):
+        # Items whose rect overlaps rect, looking only at the cells of area
+        # (e.g. a mover's swept rect), which defaults to rect itself
+        x0, y0, x1, y1 = self.cell_range(area if area else rect)
+        hits = []
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                for item, item_rect in self.cells.get((cx, cy), ()):
+                    if rect.colliderect(item_rect) and item not in hits:
+                        hits.append(item)
+        return hits
+
+class CollisionGrid:
+    # Wall rects rasterized into a boolean grid at tile resolution. A tile is
+    # blocked when any wall touches it, so the grid is conservative: a clear
+    # answer is exact and a blocked one may still need an exact rect test.
+    # Cells outside the map are open, the same as the wall rects
+    def __init__(self, rects, width, height, tile_width, tile_height):
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.blocked = np.zeros((height, width), dtype=bool)
+        for rect in rects:
+            x0, y0, x1, y1 = self.tile_range(rect.left, rect.top, rect.right, rect.bottom)
+            self.blocked[y0:y1, x0:x1] = True
+
+        # Summed-area table with a zero row and column in front
+        self.sat = np.zeros((height + 1, width + 1), dtype=np.int32)
+        self.sat[1:, 1:] = self.blocked.cumsum(axis=0).cumsum(axis=1)
+
+    @classmethod
+    def from_tmx(cls, tmx_data, rects):
+        return cls(rects, tmx_data.width, tmx_data.height, tmx_data.tilewidth, tmx_data.tileheight)
+
+    def tile_range(self, left, top, right, bottom):
+        # Half-open tile range covered by a pixel area, clipped to the grid.
+        # Works on scalars and on numpy arrays alike
+        x0 = np.clip(np.floor_divide(left, self.tile_width), 0, self.width)
+        y0 = np.clip(np.floor_divide(top, self.tile_height), 0, self.height)
+        x1 = np.clip(np.floor_divide(np.subtract(right, 1), self.tile_width) + 1, 0, self.width)
+        y1 = np.clip(np.floor_divide(np.subtract(bottom, 1), self.tile_height) + 1, 0, self.height)
+        return (np.asarray(x0, dtype=np.intp), np.asarray(y0, dtype=np.intp),
+                np.asarray(x1, dtype=np.intp), np.asarray(y1, dtype=np.intp))
+
+    def is_blocked(self, x, y):
+        tx = int(x // self.tile_width)
+        ty = int(y // self.tile_height)
+        if 0 <= tx < self.width and 0 <= ty < self.height:
+            return bool(self.blocked[ty, tx])
+        return False
+
+    def blocked_count(self, left, top, right, bottom):
+        x0, y0, x1, y1 = self.tile_range(left, top, right, bottom)
+        # Empty ranges (fully outside the map) count as zero
+        x1 = np.maximum(x0, x1)
+        y1 = np.maximum(y0, y1)
+        sat = self.sat
+        return sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+
+    def any_blocked(self, rect):
+        # Same as blocked_count, in plain integers; numpy calls on single
+        # values cost more than the lookup itself
+        x0 = min(max(rect.left // self.tile_width, 0), self.width)
+        y0 = min(max(rect.top // self.tile_height, 0), self.height)
+        x1 = min(max((rect.right - 1) // self.tile_width + 1, x0), self.width)
+        y1 = min(max((rect.bottom - 1) // self.tile_height + 1, y0), self.height)
+        sat = self.sat
+        return bool(sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0])
+
+    def any_blocked_many(self, lefts, tops, rights, bottoms):
+        # Vectorized any_blocked over arrays of rect edges
+        return self.blocked_count(lefts, tops, rights, bottoms) > 0
+
+class LineOfSight:
+    # Raycasts between tile centers over a CollisionGrid. Walls never move, so
+    # a result stays valid for as long as both ends stay in the same tiles and
+    # is cached per tile pair. Only `budget` new raycasts run per frame; a
+    # caller that runs out keeps its previous answer until the next frame
+    def __init__(self, grid, budget=16, max_cached=4096):
+        self.grid = grid
+        self.budget = budget
+        self.remaining = budget
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def begin_frame(self):
+        self.remaining = self.budget
+
+    def tile_of(self, pos):
+        return (int(pos[0] // self.grid.tile_width), int(pos[1] // self.grid.tile_height))
+
+    def raycast(self, start, end):
+        # Walk every tile the line between the two tile centers passes
+        # through, one tile edge at a time. Where it crosses a corner
+        # exactly, both tiles beside the corner are checked. Both end tiles
+        # are skipped since the grid is conservative next to walls
+        (x, y), (x1, y1) = start, end
+        dx, dy = abs(x1 - x), abs(y1 - y)
+        sx = 1 if x1 > x else -1
+        sy = 1 if y1 > y else -1
+        # error > 0 when the line reaches the next column edge first,
+        # < 0 for the next row edge and 0 on a corner, kept in integers
+        error = dx - dy
+        remaining = dx + dy
+        while remaining > 1:
+            if error > 0:
+                x += sx
+                error -= 2 * dy
+                remaining -= 1
+            elif error < 0:
+                y += sy
+                error += 2 * dx
+                remaining -= 1
+            else:
+                if self.blocked_at(x + sx, y) or self.blocked_at(x, y + sy):
+                    return False
+                x += sx
+                y += sy
+                error += 2 * (dx - dy)
+                remaining -= 2
+                if remaining == 0:
+                    break
+            if self.blocked_at(x, y):
+                return False
+        return True
+
+    def blocked_at(self, x, y):
+        grid = self.grid
+        return 0 <= x < grid.width and 0 <= y < grid.height and bool(grid.blocked[y, x])
+
+    def visible(self, from_pos, to_pos, previous=False):
+        start = self.tile_of(from_pos)
+        end = self.tile_of(to_pos)
+        # Sight is symmetric, so both directions share one entry
+        key = (start, end) if start <= end else (end, start)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return result
+        if self.remaining <= 0:
+            return previous
+        self.remaining -= 1
+        self.misses += 1
+        result = self.raycast(start, end)
+        self.cache[key] = result
+        if len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+        return result
+
+# Steps to the 8 neighbouring tiles. Step codes index these; -1 is no step
+STEP_X = np.array([-1, 0, 1, -1, 1, -1, 0, 1])
+STEP_Y = np.array([-1, -1, -1, 0, 0, 1, 1, 1])
+
+def grow_wavefront(frontier, reached, walkable):
+    # The next ring of a breadth-first wavefront over the walkable tiles
+    grown = frontier.copy()
+    grown[1:] |= frontier[:-1]
+    grown[:-1] |= frontier[1:]
+    grown[:, 1:] |= frontier[:, :-1]
+    grown[:, :-1] |= frontier[:, 1:]
+    frontier = grown & walkable & ~reached
+    reached |= frontier
+    return frontier
+
+def descent_steps(dist):
+    # Step code toward each tile's cheapest neighbour in a wavefront distance
+    # field (-1 marks unreached tiles). Unreached tiles still get a step onto
+    # the field, which walks a mob hugging a wall back onto it. Diagonals
+    # that would cut a blocked corner are skipped
+    h, w = dist.shape
+    cost = np.full((h + 2, w + 2), np.inf, dtype=np.float32)
+    cost[1:-1, 1:-1] = np.where(dist >= 0, dist, np.inf)
+    best = cost[1:-1, 1:-1].copy()
+    steps = np.full((h, w), -1, dtype=np.int8)
+    for code, (dx, dy) in enumerate(zip(STEP_X, STEP_Y)):
+        neighbor = cost[1 + dy:h + 1 + dy, 1 + dx:w + 1 + dx]
+        if dx and dy:
+            open_x = np.isfinite(cost[1:h + 1, 1 + dx:w + 1 + dx])
+            open_y = np.isfinite(cost[1 + dy:h + 1 + dy, 1:w + 1])
+            neighbor = np.where(open_x & open_y, neighbor, np.inf)
+        better = neighbor < best
+        best = np.where(better, neighbor, best)
+        steps[better] = code
+    return steps
+
+def steer_along(steps, xs, ys, tx, ty, tile_size):
+    # Unit directions from positions toward the center of the tile their
+    # step code points at. valid is False where there is no step. The aim is
+    # the middle of the center pixel, so a rect placed at int(pos) reaches
+    # the exact tile center that a one-tile-wide corridor needs
+    tw, th = tile_size
+    valid = steps >= 0
+    sx = np.where(valid, STEP_X[steps], 0)
+    sy = np.where(valid, STEP_Y[steps], 0)
+    dx = (tx + sx) * tw + tw // 2 + 0.5 - xs
+    dy = (ty + sy) * th + th // 2 + 0.5 - ys
+    length = np.hypot(dx, dy)
+    valid &= length > 0
+    length[~valid] = 1
+    return dx / length, dy / length, valid
+
+class FlowField:
+    # Shared chase directions toward the player. A breadth-first wavefront
+    # runs from the player's tile over the tiles a mob-sized rect fits in,
+    # limited to `radius` tiles around the player. It restarts only when the
+    # player changes tile and advances `steps_per_update` rings per call, so
+    # a recompute is spread over a few simulation steps while the previous
+    # field keeps answering. Mobs then read their next tile in O(1) and
+    # steer at its center, which keeps them off the walls the field avoids
+    def __init__(self, walls, agent_size, radius=48, steps_per_update=32):
+        self.grid = walls.grid
+        self.radius = radius
+        self.steps_per_update = steps_per_update
+        self.walkable = walls.clearance(agent_size)
+
+        self.target = None
+        self.pending = None
+        # The finished field: window origin and per-tile step codes
+        self.origin = (0, 0)
+        self.steps = np.zeros((0, 0), dtype=np.int8)
+        self.recomputes = 0
+
+    def tile_of(self, pos):
+        return (int(pos[0] // self.grid.tile_width), int(pos[1] // self.grid.tile_height))
+
+    def update(self, target_pos):
+        tile = self.tile_of(target_pos)
+        if tile != self.target:
+            self.target = tile
+            self.start(tile)
+        if self.pending is not None:
+            self.advance()
+
+    def start(self, tile):
+        tx, ty = tile
+        x0 = max(tx - self.radius, 0)
+        y0 = max(ty - self.radius, 0)
+        x1 = min(tx + self.radius + 1, self.grid.width)
+        y1 = min(ty + self.radius + 1, self.grid.height)
+        if x0 >= x1 or y0 >= y1:
+            self.pending = None
+            return
+        walkable = self.walkable[y0:y1, x0:x1]
+        dist = np.full(walkable.shape, -1, dtype=np.int32)
+        frontier = np.zeros(walkable.shape, dtype=bool)
+        # The player's own tile is always a source, even when a mob would
+        # not fit there
+        frontier[ty - y0, tx - x0] = True
+        self.pending = [(x0, y0), walkable, dist, frontier, frontier.copy(), 0]
+
+    def advance(self):
+        origin, walkable, dist, frontier, reached, d = self.pending
+        for _ in range(self.steps_per_update):
+            if not frontier.any():
+                self.origin = origin
+                self.steps = descent_steps(dist)
+                self.pending = None
+                self.recomputes += 1
+                return
+            dist[frontier] = d
+            frontier = grow_wavefront(frontier, reached, walkable)
+            d += 1
+        self.pending[3:] = [frontier, reached, d]
+
+    def directions_at(self, xs, ys):
+        # Unit directions toward the player for arrays of positions. valid is
+        # False outside the field and on the player's own tile, where a mob
+        # can just steer straight at it
+        tx = np.floor_divide(xs, self.grid.tile_width).astype(np.intp)
+        ty = np.floor_divide(ys, self.grid.tile_height).astype(np.intp)
+        x = tx - self.origin[0]
+        y = ty - self.origin[1]
+        h, w = self.steps.shape
+        inside = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+        steps = np.full(len(xs), -1, dtype=np.int8)
+        steps[inside] = self.steps[y[inside], x[inside]]
+        return steer_along(steps, xs, ys, tx, ty, (self.grid.tile_width, self.grid.tile_height))
+
+class NavGraph:
+    # Routes between the map's key points (spawns, start, interactables),
+    # built once from the wall layout over the tiles a mob fits on. For each
+    # key point a wavefront over the whole map gives every tile its next
+    # step toward that point, so following a route is one table lookup per
+    # tile, and the same passes give the distances between all key points.
+    # The tables are saved next to the map and rebuilt when the walls, the
+    # key points or the settings change
+    VERSION = 1
+
+    def __init__(self, key_tiles, next_step, key_distance, tile_size):
+        self.key_tiles = key_tiles
+        self.next_step = next_step
+        self.key_distance = key_distance
+        self.tile_width, self.tile_height = tile_size
+
+    @classmethod
+    def signature(cls, walls, key_points, agent_size):
+        digest = hashlib.sha1(repr((cls.VERSION, walls.edges.tolist(), key_points,
+                                    tuple(agent_size))).encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def load_or_build(cls, path, walls, key_points, agent_size=(16, 24)):
+        key_points = [tuple(map(float, point)) for point in key_points]
+        signature = cls.signature(walls, key_points, agent_size)
+        tile_size = (walls.grid.tile_width, walls.grid.tile_height)
+        try:
+            with np.load(path) as data:
+                if str(data["signature"]) == signature:
+                    return cls(data["key_tiles"], data["next_step"], data["key_distance"], tile_size)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Missing, stale or damaged files are all rebuilt
+            pass
+        nav = cls.build(walls, key_points, agent_size)
+        # Written to a temporary file next to the map and moved into place,
+        # so a game closed halfway through never leaves a partial file
+        temp = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", suffix=".npz",
+                                             delete=False) as temp:
+                np.savez_compressed(temp, signature=signature, key_tiles=nav.key_tiles,
+                                    next_step=nav.next_step, key_distance=nav.key_distance)
+            os.replace(temp.name, path)
+        except OSError:
+            print(f"Could not save navigation graph to {path}")
+            if temp is not None and os.path.exists(temp.name):
+                os.remove(temp.name)
+        return nav
+
+    @classmethod
+    def build(cls, walls, key_points, agent_size):
+        grid = walls.grid
+        walkable = walls.clearance(agent_size)
+        # Points off the edge of the map use the nearest tile on it
+        key_tiles = np.array([(min(max(int(x // grid.tile_width), 0), grid.width - 1),
+                               min(max(int(y // grid.tile_height), 0), grid.height - 1))
+                              for x, y in key_points], dtype=np.intp).reshape(-1, 2)
+        next_step = np.full((len(key_tiles), grid.height, grid.width), -1, dtype=np.int8)
+        key_distance = np.full((len(key_tiles), len(key_tiles)), np.inf, dtype=np.float32)
+        for k, (tx, ty) in enumerate(key_tiles):
+            dist = np.full(walkable.shape, -1, dtype=np.int32)
+            frontier = np.zeros(walkable.shape, dtype=bool)
+            frontier[ty, tx] = True
+            reached = frontier.copy()
+            d = 0
+            while frontier.any():
+                dist[frontier] = d
+                frontier = grow_wavefront(frontier, reached, walkable)
+                d += 1
+            next_step[k] = descent_steps(dist)
+            # Key tiles a mob does not fit on count from the tile they step to
+            kx, ky = key_tiles[:, 0], key_tiles[:, 1]
+            at_keys = dist[ky, kx].astype(np.float32)
+            step = next_step[k, ky, kx]
+            stepped = (at_keys < 0) & (step >= 0)
+            at_keys[stepped] = dist[ky[stepped] + STEP_Y[step[stepped]],
+                                    kx[stepped] + STEP_X[step[stepped]]] + 1
+            at_keys[at_keys < 0] = np.inf
+            key_distance[k] = at_keys
+        return cls(key_tiles, next_step, key_distance, (grid.tile_width, grid.tile_height))
+
+    def tiles_of(self, xs, ys):
+        tx = np.floor_divide(xs, self.tile_width).astype(np.intp)
+        ty = np.floor_divide(ys, self.tile_height).astype(np.intp)
+        h, w = self.next_step.shape[1:]
+        return np.clip(tx, 0, w - 1), np.clip(ty, 0, h - 1)
+
+    def reachable_keys(self, tx, ty):
+        # Key points with a route from tile (tx, ty), not counting one that is
+        # on that tile already
+        return np.flatnonzero(self.next_step[:, ty, tx] >= 0)
+
+    def directions_to(self, goals, xs, ys):
+        # Unit directions along the routes toward key points goals. valid is
+        # False with no route, and on the goal's own tile
+        tx, ty = self.tiles_of(xs, ys)
+        steps = self.next_step[goals, ty, tx]
+        return steer_along(steps, xs, ys, tx, ty, (self.tile_width, self.tile_height))
+
+    def report(self):
+        connected = np.isfinite(self.key_distance).mean() * 100
+        return f"Nav graph: {len(self.key_tiles)} key points, {connected:.0f}% of key pairs connected"
+
+class WallGeometry:
+    # Collision-only wall rects. At load, rects that sit inside another or that
+    # line up edge to edge with an overlapping or touching neighbour are merged,
+    # which keeps the exact same blocked area with fewer rects
+    def __init__(self, rects, cell_size=32):
+        self.source_count = len(rects)
+        self.rects = self.merge(rects)
+        self.index = StaticSpatialHash(cell_size)
+        for i, rect in enumerate(self.rects):
+            self.index.insert(i, rect)
+        # Edges as arrays for the vectorized sweep. Empty rects never collide
+        solid = [rect for rect in self.rects if rect.width and rect.height]
+        self.edges = np.array([(r.left, r.top, r.right, r.bottom) for r in solid],
+                              dtype=float).reshape(-1, 4)
+        self.grid = None
+
+    @classmethod
+    def from_tmx(cls, tmx_data, cell_size=32):
+        rects = [pygame.Rect(obj.x, obj.y, obj.width, obj.height)
+                 for obj in tmx_data.objects if obj.name == "Wall"]
+        walls = cls(rects, cell_size)
+        walls.grid = CollisionGrid.from_tmx(tmx_data, walls.rects)
+        return walls
+
+    @staticmethod
+    def can_merge(a, b):
+        # True when the bounding rect of a and b is exactly their union
+        if a.contains(b) or b.contains(a):
+            return True
+        if a.left == b.left and a.right == b.right:
+            return a.top <= b.bottom and b.top <= a.bottom
+        if a.top == b.top and a.bottom == b.bottom:
+            return a.left <= b.right and b.left <= a.right
+        return False
+
+    @classmethod
+    def merge(cls, rects):
+        rects = [pygame.Rect(rect) for rect in rects]
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                for j in range(len(rects) - 1, i, -1):
+                    if cls.can_merge(rects[i], rects[j]):
+                        rects[i] = rects[i].union(rects.pop(j))
+                        merged = True
+        return rects
+
+    def collide(self, rect, area=None):
+        # Wall rects overlapping rect, looking only at the cells of area.
+        # The occupancy grid rules out most open areas without touching a rect
+        if self.grid and not self.grid.any_blocked(rect):
+            return []
+        return [self.rects[i] for i in self.index.collide(rect, area)]
+
+    def is_clear(self, rect):
+        return not self.collide(rect)
+
+    def clip_move(self, rect, dx, dy):
+        # How far rect can travel along one axis (the other delta is zero)
+        # before it touches a wall. The whole path is checked, so fast movers
+        # cannot skip over thin walls. Walls rect already overlaps are ignored
+        # so a mover can always get out of one
+        if dx > 0:
+            area = pygame.Rect(rect.right, rect.top, math.ceil(dx), rect.height)
+            for wall in self.collide(area):
+                if wall.left >= rect.right:
+                    dx = min(dx, wall.left - rect.right)
+            return dx
+        if dx < 0:
+            area = pygame.Rect(rect.left - math.ceil(-dx), rect.top, math.ceil(-dx), rect.height)
+            for wall in self.collide(area):
+                if wall.right <= rect.left:
+                    dx = max(dx, wall.right - rect.left)
+            return dx
+        if dy > 0:
+            area = pygame.Rect(rect.left, rect.bottom, rect.width, math.ceil(dy))
+            for wall in self.collide(area):
+                if wall.top >= rect.bottom:
+                    dy = min(dy, wall.top - rect.bottom)
+            return dy
+        if dy < 0:
+            area = pygame.Rect(rect.left, rect.top - math.ceil(-dy), rect.width, math.ceil(-dy))
+            for wall in self.collide(area):
+                if wall.bottom <= rect.top:
+                    dy = max(dy, wall.bottom - rect.top)
+            return dy
+        return 0
+
+    def clearance(self, size):
+        # Tiles of the collision grid where a rect of size, centered on the
+        # tile, touches no wall. Exact, unlike the grid itself: each wall is
+        # grown by the rect's extent and rasterized over the tile centers
+        grid = self.grid
+        width, height = size
+        xs = np.arange(grid.width) * grid.tile_width + grid.tile_width // 2
+        ys = np.arange(grid.height) * grid.tile_height + grid.tile_height // 2
+        blocked = np.zeros((grid.height, grid.width), dtype=bool)
+        for left, top, right, bottom in self.edges:
+            x0 = np.searchsorted(xs, left - (width - width // 2), "right")
+            x1 = np.searchsorted(xs, right + width // 2, "left")
+            y0 = np.searchsorted(ys, top - (height - height // 2), "right")
+            y1 = np.searchsorted(ys, bottom + height // 2, "left")
+            blocked[y0:y1, x0:x1] = True
+        return ~blocked
+
+    def clip_moves(self, lefts, tops, width, height, deltas, axis):
+        # clip_move for arrays of same-sized rects that all move along one axis
+        # (0 for x, 1 for y). Every rect is tested against every wall at once,
+        # so this is meant for the few rects a broadphase could not clear
+        left, top, right, bottom = (self.edges[:, i] for i in range(4))
+        if axis == 0:
+            starts, ends = lefts, lefts + width
+            across = (top < (tops + height)[:, None]) & (bottom > tops[:, None])
+            wall_start, wall_end = left, right
+        else:
+            starts, ends = tops, tops + height
+            across = (left < (lefts + width)[:, None]) & (right > lefts[:, None])
+            wall_start, wall_end = top, bottom
+        reach = np.ceil(np.abs(deltas))[:, None]
+        # Walls ahead of the leading edge and within reach of the move
+        ahead = wall_start - ends[:, None]
+        forward = np.where(across & (ahead >= 0) & (ahead < reach), ahead, np.inf).min(axis=1)
+        behind = wall_end - starts[:, None]
+        backward = np.where(across & (behind <= 0) & (behind > -reach), behind, -np.inf).max(axis=1)
+        return np.where(deltas > 0, np.minimum(deltas, forward),
+                        np.where(deltas < 0, np.maximum(deltas, backward), 0))
+
+    def collidelistall(self, rect):
+        return sorted(self.index.collide(rect))
+
+    def collidelist(self, rect):
+        hits = self.index.collide(rect)
+        return min(hits) if hits else -1
+
+    def report(self):
+        return f"Walls: {self.source_count} rects merged into {len(self.rects)}"
 
 class Sign(pygame.sprite.Sprite):
     def __init__(self, x, y, normal_text, high_suspicion_text=None):
@@ -384,6 +1300,40 @@ class CodeTerminal(pygame.sprite.Sprite):
         self.rect = self.image.get_rect(topleft=(x, y))
         self.interact_rect = pygame.Rect(x - 40, y - 40, 140, 160)
 
+class TriggerZones:
+    # Signs and terminals placed on the map's Interactables layer, indexed by
+    # their interaction rects so finding what the player is standing near
+    # only looks at the cells under the player
+    def __init__(self, cell_size=64):
+        self.index = StaticSpatialHash(cell_size)
+        self.interactables = []
+
+    @classmethod
+    def from_tmx(cls, tmx_data, cell_size=64):
+        zones = cls(cell_size)
+        for obj in tmx_data.objects:
+            if obj.name == "Sign":
+                zones.add(Sign(obj.x, obj.y, obj.properties.get("text", ""),
+                               obj.properties.get("high_suspicion_text")))
+            elif obj.name == "Terminal":
+                zones.add(CodeTerminal(obj.x, obj.y))
+        return zones
+
+    def add(self, interactable):
+        self.interactables.append(interactable)
+        self.index.insert(interactable, interactable.interact_rect)
+
+    def find(self, rect):
+        # Returns (sign, terminal) whose interaction rects rect overlaps
+        near_sign = None
+        near_terminal = None
+        for interactable in self.index.collide(rect):
+            if isinstance(interactable, Sign):
+                near_sign = near_sign or interactable
+            else:
+                near_terminal = near_terminal or interactable
+        return near_sign, near_terminal
+
 class MusicPlayer:
     def __init__(self, music_file):
         pygame.mixer.init()
@@ -404,57 +1354,172 @@ class MusicPlayer:
     def set_volume(self, volume):
         pygame.mixer.music.set_volume(volume)
 
+def frame_masks(frames):
+    # Pixel masks for a list of animation frames, built once when they load
+    return [pygame.mask.from_surface(frame) for frame in frames]
+
+class SpriteSheet:
+    # Frames cut from one sheet and scaled to display size, with their masks.
+    # Every sprite using the sheet shares them, so nothing may draw on them
+    def __init__(self, key, frames, base=None):
+        self.key = key
+        self.frames = tuple(frames)
+        self.masks = tuple(frame_masks(frames))
+        # A tinted variant keeps its untinted sheet loaded
+        self.base = base
+        self.bytes = sum(frame.get_bytesize() * frame.get_width() * frame.get_height()
+                         for frame in frames)
+
+class SpriteAssets:
+    # Sprite sheets loaded, sliced and scaled once, shared by every sprite
+    # that uses them and dropped when the last one releases them. Tinted
+    # looks are shared variants of their own instead of fills on the frames
+    def __init__(self, sprite_dir):
+        self.sprite_dir = sprite_dir
+        self.sheets = {}
+        self.refcounts = {}
+
+    def acquire(self, filename, frame_size, cols, rows, display_size, tint=None):
+        key = (filename, frame_size, cols, rows, display_size, tint)
+        sheet = self.sheets.get(key)
+        if sheet is None:
+            if tint is None:
+                sheet = SpriteSheet(key, self.slice(filename, frame_size, cols, rows, display_size))
+            else:
+                base = self.acquire(filename, frame_size, cols, rows, display_size)
+                frames = [frame.copy() for frame in base.frames]
+                for frame in frames:
+                    frame.fill(tint, special_flags=pygame.BLEND_MULT)
+                sheet = SpriteSheet(key, frames, base)
+            self.sheets[key] = sheet
+            self.refcounts[key] = 0
+        self.refcounts[key] += 1
+        return sheet
+
+    def release(self, sheet):
+        key = sheet.key
+        self.refcounts[key] -= 1
+        if self.refcounts[key] == 0:
+            del self.sheets[key]
+            del self.refcounts[key]
+            if sheet.base is not None:
+                self.release(sheet.base)
+
+    def slice(self, filename, frame_size, cols, rows, display_size):
+        width, height = frame_size
+        try:
+            sprite_sheet = pygame.image.load(os.path.join(self.sprite_dir, filename)).convert_alpha()
+        except (pygame.error, OSError):
+            # Create placeholder sprite sheet
+            sprite_sheet = pygame.Surface((cols * width, rows * height), pygame.SRCALPHA)
+            font = text_cache.font(None, 20)
+            for row in range(rows):
+                for col in range(cols):
+                    x = col * width
+                    y = row * height
+                    color = (row * 60 % 255, 100 + col * 30 % 155, 50 + (row + col) * 20 % 205)
+                    pygame.draw.rect(sprite_sheet, color, (x, y, width, height))
+                    pygame.draw.rect(sprite_sheet, BLACK, (x, y, width, height), 1)
+                    text = font.render(f"Frame {row * cols + col + 1}", True, BLACK)
+                    sprite_sheet.blit(text, (x + 5, y + 5))
+
+        frames = []
+        for row in range(rows):
+            for col in range(cols):
+                frame = pygame.Surface((width, height), pygame.SRCALPHA)
+                frame.blit(sprite_sheet, (0, 0), (col * width, row * height, width, height))
+                frames.append(pygame.transform.scale(frame, display_size))
+        return frames
+
+    def report(self):
+        lines = [f"{key[0]}{' tinted' if key[5] else ''}: {self.refcounts[key]} refs, {sheet.bytes // 1024} KB"
+                 for key, sheet in self.sheets.items()]
+        total = sum(sheet.bytes for sheet in self.sheets.values())
+        return "\n".join(lines + [f"Sprite assets: {total // 1024} KB"])
+
+sprite_assets = SpriteAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sprites"))
+
 class AnimatedSprite(pygame.sprite.Sprite):
-    def __init__(self, position, frames, animation_speed=0.1):
+    def __init__(self, position, frames, animation_speed=0.1, masks=None):
         super().__init__()
         self.frames = frames
+        # One mask per frame; self.mask always matches self.image
+        self.masks = masks if masks is not None else frame_masks(frames)
         self.current_frame = 0
         self.animation_speed = animation_speed
         self.animation_time = 0
         self.image = frames[self.current_frame]
+        self.mask = self.masks[self.current_frame]
         self.rect = self.image.get_rect(center=position)
         self.pos = pygame.Vector2(position)
+        self.prev_pos = self.pos.copy()
         self.direction = pygame.Vector2(0, 0)
         self.speed = PLAYER_SPEED
-        
-    def update(self, dt):
+
+    def store_previous(self):
+        # Called before each simulation step so rendering can interpolate
+        self.prev_pos.update(self.pos)
+
+    def interpolated_rect(self, alpha):
+        rect = self.rect.copy()
+        # int() like the collision rect, so a sprite at rest is drawn exactly
+        # where it collides
+        rect.center = (int(self.prev_pos.x + (self.pos.x - self.prev_pos.x) * alpha),
+                       int(self.prev_pos.y + (self.pos.y - self.prev_pos.y) * alpha))
+        return rect
+
+    def set_animation(self, frames, masks):
+        if self.frames != frames:
+            self.frames = frames
+            self.masks = masks
+            self.current_frame = 0
+
+    def update(self, dt, walls=None):
         self.animation_time += dt
         if self.animation_time >= self.animation_speed:
             self.animation_time = 0
             self.current_frame = (self.current_frame + 1) % len(self.frames)
             self.image = self.frames[self.current_frame]
+            self.mask = self.masks[self.current_frame]
         
         if self.direction.length() > 0:
             self.direction = self.direction.normalize()
         
         old_pos = self.pos.copy()
-        self.pos += self.direction * self.speed * dt
+        move = self.direction * self.speed * dt
+        if walls is None:
+            self.pos += move
+        else:
+            # Slide along walls: resolve X first, then Y from the new position.
+            # pos is the source of truth, so start from the rect it implies
+            self.rect.center = (int(self.pos.x), int(self.pos.y))
+            self.pos.x += walls.clip_move(self.rect, move.x, 0)
+            self.rect.center = (int(self.pos.x), int(self.pos.y))
+            self.pos.y += walls.clip_move(self.rect, 0, move.y)
         self.rect.center = (int(self.pos.x), int(self.pos.y))
         #self.rect.clamp_ip(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.rect.clamp_ip(pygame.Rect(0, 0, WORLD_WIDTH, WORLD_HEIGHT))
-        self.pos.x, self.pos.y = self.rect.center
+        # Keep the sub-pixel position unless the world edge moved the rect;
+        # fixed steps are often less than a pixel long
+        clamped = self.rect.clamp(pygame.Rect(0, 0, WORLD_WIDTH, WORLD_HEIGHT))
+        if clamped != self.rect:
+            self.rect = clamped
+            self.pos.x, self.pos.y = self.rect.center
         
         return old_pos
 
 class Player(AnimatedSprite):
     def __init__(self, x, y):
-        self.sprite_width = 80
-        self.sprite_height = 120
-        self.cols = 2
-        self.rows = 4
-        self.display_width = 16
-        self.display_height = 24
-
-        sprite_sheet = self.load_sprite_sheet("player.png", self.cols, self.rows)
-        
-        self.animations = {
-            "down": sprite_sheet[0:2],
-            "left": sprite_sheet[2:4],
-            "right": sprite_sheet[4:6],
-            "up": sprite_sheet[6:8]
+        self.sheet = sprite_assets.acquire("player.png", (80, 120), 2, 4, (16, 24))
+        rows = {
+            "down": slice(0, 2),
+            "left": slice(2, 4),
+            "right": slice(4, 6),
+            "up": slice(6, 8)
         }
+        self.animations = {name: self.sheet.frames[row] for name, row in rows.items()}
+        self.animation_masks = {name: self.sheet.masks[row] for name, row in rows.items()}
         
-        super().__init__((x, y), self.animations["down"])
+        super().__init__((x, y), self.animations["down"], masks=self.animation_masks["down"])
         self.current_animation = "down"
         self.last_direction = "down"
         self.can_interact = False
@@ -464,38 +1529,7 @@ class Player(AnimatedSprite):
         self.stun_duration = 3.0
         self.stun_cooldown_time = 5.0
         
-    def load_sprite_sheet(self, filename, cols, rows):
-        try:
-            full_path = os.path.join("323Game", "Sprites", filename)
-            sprite_sheet = pygame.image.load(full_path).convert_alpha()
-        except:
-            sprite_sheet = pygame.Surface((cols * self.sprite_width, rows * self.sprite_height), pygame.SRCALPHA)
-            for row in range(rows):
-                for col in range(cols):
-                    x = col * self.sprite_width
-                    y = row * self.sprite_height
-                    color = (row * 60 % 255, 100 + col * 30 % 155, 50 + (row + col) * 20 % 205)
-                    pygame.draw.rect(sprite_sheet, color, (x, y, self.sprite_width, self.sprite_height))
-                    pygame.draw.rect(sprite_sheet, BLACK, (x, y, self.sprite_width, self.sprite_height), 1)
-                    font = pygame.font.SysFont(None, 20)
-                    direction = ["Down", "Left", "Right", "Up"][row]
-                    text = font.render(f"{direction} {col+1}", True, BLACK)
-                    sprite_sheet.blit(text, (x + 5, y + 5))
-        
-        frames = []
-        for row in range(rows):
-            for col in range(cols):
-                frame = pygame.Surface((self.sprite_width, self.sprite_height), pygame.SRCALPHA)
-                frame.blit(sprite_sheet, (0, 0),
-                          (col * self.sprite_width,
-                           row * self.sprite_height,
-                           self.sprite_width,
-                           self.sprite_height))
-                scaled_frame = pygame.transform.scale(frame, (self.display_width, self.display_height))
-                frames.append(scaled_frame)
-        return frames
-    
-    def update(self, dt, walls, signs, terminal, mobs=None, camera=None):
+    def update(self, dt, walls, triggers, mobs=None, camera=None):
         keys = pygame.key.get_pressed()
         move_vec = pygame.Vector2(0, 0)
         
@@ -524,37 +1558,17 @@ class Player(AnimatedSprite):
             else:
                 self.current_animation = "up" if move_vec.y < 0 else "down"
             
-            if self.frames != self.animations[self.current_animation]:
-                self.frames = self.animations[self.current_animation]
-                self.current_frame = 0
+            self.set_animation(self.animations[self.current_animation],
+                               self.animation_masks[self.current_animation])
         else:
-            if self.frames != self.animations[self.last_direction]:
-                self.frames = self.animations[self.last_direction]
-                self.current_frame = 0
-        
-        old_pos = super().update(dt)
-        
-        wall_collisions = pygame.sprite.spritecollide(self, walls, False)
-        if wall_collisions:
-            self.pos = old_pos
-            self.rect.center = self.pos
+            self.set_animation(self.animations[self.last_direction],
+                               self.animation_masks[self.last_direction])
         
-        # Check for interactions
-        self.can_interact = False
-        self.near_sign = None
-        self.near_terminal = None
+        super().update(dt, walls)
         
-        # Check signs
-        for sign in signs:
-            if self.rect.colliderect(sign.interact_rect):
-                self.can_interact = True
-                self.near_sign = sign
-                break
-        
-        # Check terminal
-        if terminal and self.rect.colliderect(terminal.interact_rect):
-            self.can_interact = True
-            self.near_terminal = terminal
+        # Check signs and terminals
+        self.near_sign, self.near_terminal = triggers.find(self.rect)
+        self.can_interact = bool(self.near_sign or self.near_terminal)
         
         if self.stun_cooldown > 0:
             self.stun_cooldown -= dt
@@ -566,186 +1580,506 @@ class Player(AnimatedSprite):
                 self.speed = PLAYER_SPEED
     
     def stun_nearby_mobs(self, mobs):
-        for mob in mobs:
-            dx = mob.rect.centerx - self.rect.centerx
-            dy = mob.rect.centery - self.rect.centery
-            distance = math.sqrt(dx**2 + dy**2)
-            
-            if distance <= self.stun_radius:
-                mob.get_stunned(self.stun_duration)
+        for mob in mobs.query_radius(self.rect.center, self.stun_radius):
+            mob.get_stunned(self.stun_duration)
 
     def slow_down(self):
         self.speed = PLAYER_SPEED * 0.5  # or any percentage you want
         self.slow_timer = 2.0  # lasts for 2 seconds
 
-class Mob(AnimatedSprite):
-    def __init__(self, x, y):
-        self.sprite_width = 42
-        self.sprite_height = 48
-        self.cols = 12
-        self.rows = 1
-        self.direction = pygame.Vector2(0, 0)
-        self.pos = pygame.Vector2(x, y)
-        self.display_width = 16
-        self.display_height = 24
+class MobLOD:
+    # Level of detail for mob AI. Mobs on screen (and every chasing mob)
+    # update each step, mobs near the player every few steps and the rest
+    # rarely. A mob banks the time of the steps it skips and spends it all
+    # on its next update. Mobs are offset by their slot, so each tier's
+    # updates are spread evenly over its period instead of landing together
+    TIERS = ("on_screen", "near", "dormant")
 
-        self.chasing = False
-        self.chase_distance = 200
-        self.base_speed = 100
-        self.chase_speed = 150
-        self.speed = self.base_speed
-        self.wander_time = 0
-        self.wander_direction = pygame.Vector2(0, 0)
+    def __init__(self, near_distance=600, periods=(1, 4, 16), view_margin=48):
+        self.near_distance = near_distance
+        self.periods = np.array(periods)
+        # Mobs are promoted this far outside the view, so the catch-up step
+        # of a dormant mob happens before it can be seen
+        self.view_margin = view_margin
+        self.step = 0
+        self.counts = dict.fromkeys(self.TIERS, 0)
+        self.updated = 0
+
+    def schedule(self, engine, dt, target, view=None):
+        # Slots due this step and the time each one has to catch up on
+        live = engine.active
+        engine.banked_dt[live] += dt
+        offsets = engine.pos - np.asarray(target, dtype=float)
+        tier = np.full(engine.capacity, 2)
+        tier[(offsets ** 2).sum(axis=1) < self.near_distance ** 2] = 1
+        if view is not None:
+            x, y = engine.pos[:, 0], engine.pos[:, 1]
+            margin = self.view_margin
+            tier[(x > view.left - margin) & (x < view.right + margin)
+                 & (y > view.top - margin) & (y < view.bottom + margin)] = 0
+        tier[engine.chasing] = 0
+
+        due = live & ((self.step + np.arange(engine.capacity)) % self.periods[tier] == 0)
+        slots = np.flatnonzero(due)
+        dts = engine.banked_dt[slots]
+        engine.banked_dt[slots] = 0
+        self.step += 1
 
-        # Randomize animation start for each mob
+        self.counts = dict(zip(self.TIERS, np.bincount(tier[live], minlength=3).tolist()))
+        self.updated = slots.size
+        return slots, dts
+
+    def report(self):
+        tiers = ", ".join(f"{name} {count}" for name, count in self.counts.items())
+        return f"Mob AI: {tiers}; {self.updated} updated last step"
+
+class MobEngine:
+    # Simulation state for every mob in parallel numpy arrays, one slot per
+    # mob. A tick runs stun timers, chase acquisition and loss, wandering,
+    # movement and animation for all slots in a handful of array operations.
+    # Mob sprites are views that read their slot back for drawing and
+    # contact checks
+    FIELDS = ("pos", "prev_pos", "direction", "wander_direction", "wander_time", "chasing",
+              "sees_player", "chase_distance", "stunned", "stun_timer", "animation_time",
+              "frame", "banked_dt", "patrol_goal", "active")
+
+    def __init__(self, walls, size=(16, 24), frame_count=12, capacity=64, lod=None, nav=None):
+        self.walls = walls
+        self.lod = lod
+        self.nav = nav
+        # Longer catch-up updates are split into steps of this length, so
+        # no move is long enough to overshoot a one-tile corridor
+        self.max_step = 1 / 30
+        self.width, self.height = size
+        self.frame_count = frame_count
+        self.base_speed = 100
+        self.base_chase_speed = 150
+        self.chase_start_distance = 200
+        self.chase_keep_distance = 300
         self.animation_speed = 0.1
-        self.animation_time = random.uniform(0, self.animation_speed * 12)
-        
-        self.stunned = False
-        self.stun_timer = 0
-        self.normal_color = (255, 255, 255)
-        self.stunned_color = (100, 100, 255)
-        
-        sprite_sheet = self.load_sprite_sheet("enemy.png", self.cols, self.rows)
-        
-        self.animations = {
-            "right": sprite_sheet
-        }
-        
-        super().__init__((x, y), self.animations["right"])
-        self.current_frame = random.randint(0, 11)  # Random starting frame
+        self.rng = np.random.default_rng()
 
-    def load_sprite_sheet(self, filename, cols, rows):
-        try:
-            full_path = os.path.join("323Game", "Sprites", filename)
-            sprite_sheet = pygame.image.load(full_path).convert_alpha()
-        except:
-            # Create placeholder sprite sheet
-            sprite_sheet = pygame.Surface((cols * self.sprite_width, rows * self.sprite_height), pygame.SRCALPHA)
-            for col in range(cols):
-                x = col * self.sprite_width
-                y = 0
-                color = (100 + col * 10 % 155, 50 + col * 20 % 205, 150 + col * 5 % 105)
-                pygame.draw.rect(sprite_sheet, color, (x, y, self.sprite_width, self.sprite_height))
-                pygame.draw.rect(sprite_sheet, (0, 0, 0), (x, y, self.sprite_width, self.sprite_height), 1)
-                font = pygame.font.SysFont(None, 20)
-                text = font.render(f"Frame {col+1}", True, (0, 0, 0))
-                sprite_sheet.blit(text, (x + 5, y + 5))
-        
-        frames = []
-        for row in range(rows):
-            for col in range(cols):
-                frame = pygame.Surface((self.sprite_width, self.sprite_height), pygame.SRCALPHA)
-                frame.blit(sprite_sheet, (0, 0),
-                          (col * self.sprite_width,
-                           row * self.sprite_height,
-                           self.sprite_width,
-                           self.sprite_height))
-                scaled_frame = pygame.transform.scale(frame, (self.display_width, self.display_height))
-                frames.append(scaled_frame)
-        return frames
-    
-    def update_speed(self, suspicion_modifier):
-        self.speed = self.base_speed * (suspicion_modifier)
-        self.chase_speed = self.chase_speed * (suspicion_modifier)
-        
-        if self.chasing and not self.stunned:
-            self.speed = self.chase_speed
-        elif not self.stunned:
-            self.speed = self.base_speed * suspicion_modifier
-    
-    def update(self, dt, player, walls):
-         # Get direction to player
-        dx = player.rect.centerx - self.rect.centerx
-        dy = player.rect.centery - self.rect.centery
-        dist = math.sqrt(dx**2 + dy**2)
-        
-        if not self.chasing:
-            if dist < self.chase_distance:
-                self.chasing = True
-                self.speed = self.chase_speed
-                self.chase_distance = 300
-            else:
-                self.wander_time -= dt
-                if self.wander_time <= 0:
-                    self.wander_direction = pygame.Vector2(random.uniform(-1, 1), random.uniform(-1, 1))
-                    if self.wander_direction.length() > 0:
-                        self.wander_direction = self.wander_direction.normalize()
-                    self.wander_time = random.uniform(2, 5)
-                
-                self.direction = self.wander_direction
-                self.speed = self.base_speed
+        self.capacity = 0
+        self.pos = np.zeros((0, 2))
+        self.prev_pos = np.zeros((0, 2))
+        self.direction = np.zeros((0, 2))
+        self.wander_direction = np.zeros((0, 2))
+        self.wander_time = np.zeros(0)
+        self.chasing = np.zeros(0, dtype=bool)
+        self.sees_player = np.zeros(0, dtype=bool)
+        self.chase_distance = np.zeros(0)
+        self.stunned = np.zeros(0, dtype=bool)
+        self.stun_timer = np.zeros(0)
+        self.animation_time = np.zeros(0)
+        self.frame = np.zeros(0, dtype=np.intp)
+        self.banked_dt = np.zeros(0)
+        self.patrol_goal = np.zeros(0, dtype=np.intp)
+        self.active = np.zeros(0, dtype=bool)
+        self.sprites = []
+        self.free = []
+        # Spatial index for the queries: active slots sorted by grid cell,
+        # rebuilt on the first query after anything moved, joined or left
+        self.cell_size = 64
+        self.cols = WORLD_WIDTH // self.cell_size + 1
+        self.rows = WORLD_HEIGHT // self.cell_size + 1
+        self.index_dirty = True
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.sprites.extend([None] * (capacity - self.capacity))
+        # Lowest slots are handed out first
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.free.sort(reverse=True)
+        self.capacity = capacity
+
+    def add(self, sprite, x, y):
+        if not self.free:
+            self.grow(self.capacity * 2)
+        slot = self.free.pop()
+        self.pos[slot] = self.prev_pos[slot] = (x, y)
+        self.direction[slot] = self.wander_direction[slot] = 0
+        self.wander_time[slot] = 0
+        self.chasing[slot] = self.sees_player[slot] = self.stunned[slot] = False
+        self.chase_distance[slot] = self.chase_start_distance
+        self.stun_timer[slot] = 0
+        self.banked_dt[slot] = 0
+        self.patrol_goal[slot] = -1
+        # Random animation phase so mobs do not march in step
+        self.animation_time[slot] = self.rng.uniform(0, self.animation_speed)
+        self.frame[slot] = self.rng.integers(self.frame_count)
+        self.active[slot] = True
+        self.sprites[slot] = sprite
+        self.index_dirty = True
+        return slot
+
+    def remove(self, slot):
+        self.active[slot] = False
+        self.sprites[slot] = None
+        self.free.append(slot)
+        self.index_dirty = True
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def store_previous(self):
+        self.prev_pos[:] = self.pos
+
+    def centers(self):
+        # Integer rect centers, the same as int() on each position
+        return np.trunc(self.pos).astype(np.intp)
+
+    def rect(self, slot):
+        rect = pygame.Rect(0, 0, self.width, self.height)
+        rect.center = (int(self.pos[slot, 0]), int(self.pos[slot, 1]))
+        return rect
+
+    def interpolated_rect(self, slot, alpha):
+        x, y = self.prev_pos[slot] + (self.pos[slot] - self.prev_pos[slot]) * alpha
+        rect = pygame.Rect(0, 0, self.width, self.height)
+        # int() like rect() and centers()
+        rect.center = (int(x), int(y))
+        return rect
+
+    def build_index(self):
+        # Counting sort of the active slots by cell: cell_start[c] is where
+        # cell c begins in cell_slots, and the cells of a grid row are
+        # contiguous, so a query reads one slice per row it covers
+        slots = np.flatnonzero(self.active)
+        centers = self.centers()[slots]
+        cx = np.clip(centers[:, 0] // self.cell_size, 0, self.cols - 1)
+        cy = np.clip(centers[:, 1] // self.cell_size, 0, self.rows - 1)
+        cells = cy * self.cols + cx
+        order = np.argsort(cells, kind="stable")
+        self.cell_slots = slots[order]
+        self.cell_centers = centers[order]
+        self.cell_start = np.zeros(self.cols * self.rows + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cells, minlength=self.cols * self.rows), out=self.cell_start[1:])
+        self.index_dirty = False
+
+    def candidates(self, left, top, right, bottom):
+        # Slots and centers of the mobs in the cells that hold the centers
+        # from (left, top) to (right, bottom), inclusive
+        if self.index_dirty:
+            self.build_index()
+        size = self.cell_size
+        x0, x1 = max(0, left // size), min(self.cols - 1, right // size)
+        y0, y1 = max(0, top // size), min(self.rows - 1, bottom // size)
+        if x0 > x1 or y0 > y1:
+            return self.cell_slots[:0], self.cell_centers[:0]
+        picks = [np.arange(self.cell_start[row + x0], self.cell_start[row + x1 + 1])
+                 for row in range(y0 * self.cols, (y1 + 1) * self.cols, self.cols)]
+        picks = np.concatenate(picks)
+        return self.cell_slots[picks], self.cell_centers[picks]
+
+    def query_rect(self, rect):
+        # Sprites of every mob whose rect overlaps rect
+        half_w, half_h = self.width // 2, self.height // 2
+        slots, centers = self.candidates(rect.left - self.width + half_w, rect.top - self.height + half_h,
+                                         rect.right + half_w, rect.bottom + half_h)
+        lefts = centers[:, 0] - half_w
+        tops = centers[:, 1] - half_h
+        hits = ((lefts < rect.right) & (lefts + self.width > rect.left)
+                & (tops < rect.bottom) & (tops + self.height > rect.top))
+        return [self.sprites[slot] for slot in slots[hits]]
+
+    def query_radius(self, center, radius):
+        # Sprites of every mob whose center lies within radius of center
+        x, y = center
+        reach = int(radius) + 1
+        slots, centers = self.candidates(x - reach, y - reach, x + reach, y + reach)
+        offsets = centers - center
+        hits = (offsets ** 2).sum(axis=1) <= radius * radius
+        return [self.sprites[slot] for slot in slots[hits]]
+
+    def any_chasing(self):
+        return bool((self.active & self.chasing & ~self.stunned).any())
+
+    def stun(self, slot, duration):
+        self.stunned[slot] = True
+        self.stun_timer[slot] = duration
+
+    def tick(self, dt, target, sight=None, flow=None, speed_modifier=1.0, view=None):
+        # Everything below works on the slots due this step, each with its
+        # own elapsed time, so the cost follows the mobs that need updating
+        if self.lod is not None:
+            slots, dts = self.lod.schedule(self, dt, target, view)
         else:
-            if dist > self.chase_distance:
-                self.chasing = False
-                self.speed = 100
-                self.chase_distance = 200
-                #return
-            else:
-                if dist > 0:
-                # Normalize direction
-                    dx /= dist
-                    dy /= dist
-                    self.direction = pygame.Vector2(dx, dy)
-
-                    
-        if self.stunned:
-            self.stun_timer -= dt
-            if self.stun_timer <= 0:
-                self.stunned = False
-                self.speed = self.base_speed
-                for frame in self.frames:
-                    frame.fill(self.normal_color, special_flags=pygame.BLEND_MULT)
-        
-        if not self.stunned:
-            if not self.chasing:
-                dx = player.rect.centerx - self.rect.centerx
-                dy = player.rect.centery - self.rect.centery
-                dist = math.sqrt(dx**2 + dy**2)
-                
-                if dist < self.chase_distance:
-                    self.chasing = True
-                    self.speed = self.chase_speed
-            else:
-                dx = player.rect.centerx - self.rect.centerx
-                dy = player.rect.centery - self.rect.centery
-                dist = math.sqrt(dx**2 + dy**2)
-                
-                if dist > 0:
-                    dx /= dist
-                    dy /= dist
-                    self.direction = pygame.Vector2(dx, dy)
-                
-                if dist > self.chase_distance * 1.5:
-                    self.chasing = False
-                    self.speed = self.base_speed
-        
-            old_pos = super().update(dt)
-            
-            wall_collisions = pygame.sprite.spritecollide(self, walls, False)
-            if wall_collisions:
-                self.pos = old_pos
-                self.rect.center = self.pos
-            
-            if self.rect.top > SCREEN_HEIGHT + 15 or self.rect.left < -15 or self.rect.right > SCREEN_WIDTH + 15:
-                self.rect.x = random.randrange(SCREEN_WIDTH - self.sprite_width)
-                self.rect.y = random.randrange(-100, -50)
-                self.chasing = False
-                self.speed = self.base_speed
-    
+            slots = np.flatnonzero(self.active)
+            dts = np.full(slots.size, dt)
+        while slots.size:
+            step = np.minimum(dts, self.max_step)
+            self.update_slots(slots, step, target, sight, flow, speed_modifier)
+            dts = dts - step
+            remaining = dts > 1e-9
+            slots, dts = slots[remaining], dts[remaining]
+        self.index_dirty = True
+
+    def update_slots(self, slots, dts, target, sight, flow, speed_modifier):
+        # Stun timers
+        stunned = self.stunned[slots]
+        self.stun_timer[slots[stunned]] -= dts[stunned]
+        self.stunned[slots[stunned & (self.stun_timer[slots] <= 0)]] = False
+        stunned = self.stunned[slots]
+
+        to_target = np.asarray(target, dtype=float) - self.pos[slots]
+        dist = np.hypot(to_target[:, 0], to_target[:, 1])
+
+        # Chases end out of range. They start in range, but only with line
+        # of sight, which is checked for the few mobs that are close enough
+        lost = slots[self.chasing[slots] & (dist > self.chase_distance[slots])]
+        self.chasing[lost] = False
+        self.chase_distance[lost] = self.chase_start_distance
+        # They pick a new patrol from wherever the chase left them
+        self.patrol_goal[lost] = -1
+        self.wander_time[lost] = 0
+        in_range = slots[~self.chasing[slots] & (dist < self.chase_distance[slots])]
+        if sight is not None:
+            for slot in in_range:
+                self.sees_player[slot] = sight.visible(self.pos[slot], target, self.sees_player[slot])
+            in_range = in_range[self.sees_player[in_range]]
+        self.chasing[in_range] = True
+        self.chase_distance[in_range] = self.chase_keep_distance
+        chasing = self.chasing[slots]
+
+        wandering = slots[~chasing]
+        self.wander_time[wandering] -= dts[~chasing]
+        if self.nav is not None:
+            wandering = wandering[~self.patrol(wandering)]
+
+        # Mobs without a route pick a new random heading every 2-5 seconds
+        expired = wandering[self.wander_time[wandering] <= 0]
+        if expired.size:
+            headings = self.rng.uniform(-1, 1, (expired.size, 2))
+            lengths = np.hypot(headings[:, 0], headings[:, 1])[:, None]
+            self.wander_direction[expired] = np.divide(headings, lengths, out=np.zeros_like(headings),
+                                                       where=lengths > 0)
+            self.wander_time[expired] = self.rng.uniform(2, 5, expired.size)
+        self.direction[wandering] = self.wander_direction[wandering]
+
+        # Chasers follow the flow field, or head straight at the target
+        steering = chasing & ~stunned & (dist > 0)
+        if steering.any():
+            chasers = slots[steering]
+            heading = to_target[steering] / dist[steering, None]
+            if flow is not None:
+                dx, dy, valid = flow.directions_at(self.pos[chasers, 0], self.pos[chasers, 1])
+                heading[valid, 0] = dx[valid]
+                heading[valid, 1] = dy[valid]
+            self.direction[chasers] = heading
+
+        if not stunned.all():
+            self.move(slots[~stunned], dts[~stunned], speed_modifier)
+            self.animate(slots[~stunned], dts[~stunned])
+
+    def patrol(self, slots):
+        # Patrolling mobs walk the nav graph from key point to key point.
+        # Returns which of slots have a route; the rest wander at random
+        nav = self.nav
+        xs, ys = self.pos[slots, 0], self.pos[slots, 1]
+        goals = self.patrol_goal[slots]
+        dx, dy, routed = nav.directions_to(np.maximum(goals, 0), xs, ys)
+        routed &= goals >= 0
+
+        # Mobs on their goal's tile pick the next one among the key points
+        # they can reach. So do lost mobs (new, or out of a chase), each time
+        # their wander timer runs out
+        arrived = (goals >= 0) & ~routed
+        retry = (goals < 0) & (self.wander_time[slots] <= 0)
+        picking = np.flatnonzero(arrived | retry)
+        if picking.size:
+            tx, ty = nav.tiles_of(xs[picking], ys[picking])
+            for i, x, y in zip(picking, tx, ty):
+                keys = nav.reachable_keys(x, y)
+                keys = keys[keys != goals[i]]
+                goals[i] = self.rng.choice(keys) if keys.size else -1
+            self.patrol_goal[slots] = goals
+            picked = picking[goals[picking] >= 0]
+            dx[picked], dy[picked], routed[picked] = nav.directions_to(goals[picked], xs[picked], ys[picked])
+
+        self.direction[slots[routed], 0] = dx[routed]
+        self.direction[slots[routed], 1] = dy[routed]
+        return routed
+
+    def move(self, movers, dt, speed_modifier):
+        speed = np.where(self.chasing[movers], self.base_chase_speed, self.base_speed) * speed_modifier
+        delta = self.direction[movers] * (speed * dt)[:, None]
+        start = np.trunc(self.pos[movers]).astype(np.intp)
+        end = np.trunc(self.pos[movers] + delta).astype(np.intp)
+        half_w, half_h = self.width // 2, self.height // 2
+
+        # Broadphase: a mob whose whole swept box is clear of the collision
+        # grid moves freely, and only the rest take the exact wall sweep
+        lefts = np.minimum(start[:, 0], end[:, 0]) - half_w
+        tops = np.minimum(start[:, 1], end[:, 1]) - half_h
+        rights = np.maximum(start[:, 0], end[:, 0]) - half_w + self.width
+        bottoms = np.maximum(start[:, 1], end[:, 1]) - half_h + self.height
+        blocked = self.walls.grid.any_blocked_many(lefts, tops, rights, bottoms)
+        clear = ~blocked
+        self.pos[movers[clear]] += delta[clear]
+
+        # The same X-then-Y slide as AnimatedSprite.update, for all of them
+        slots = movers[blocked]
+        if slots.size:
+            pos = self.pos[slots]
+            tops = np.trunc(pos[:, 1]) - half_h
+            pos[:, 0] += self.walls.clip_moves(np.trunc(pos[:, 0]) - half_w, tops, self.width,
+                                               self.height, delta[blocked, 0], 0)
+            pos[:, 1] += self.walls.clip_moves(np.trunc(pos[:, 0]) - half_w, tops, self.width,
+                                               self.height, delta[blocked, 1], 1)
+            self.pos[slots] = pos
+
+        # Keep rects inside the world. Like the player, a mob keeps its
+        # sub-pixel position unless the clamp moves it
+        centers = np.trunc(self.pos[movers]).astype(np.intp)
+        clamped = centers.copy()
+        np.clip(clamped[:, 0], half_w, WORLD_WIDTH - self.width + half_w, out=clamped[:, 0])
+        np.clip(clamped[:, 1], half_h, WORLD_HEIGHT - self.height + half_h, out=clamped[:, 1])
+        moved = (clamped != centers).any(axis=1)
+        self.pos[movers[moved]] = clamped[moved]
+
+    def animate(self, slots, dt):
+        self.animation_time[slots] += dt
+        advance = slots[self.animation_time[slots] >= self.animation_speed]
+        self.animation_time[advance] = 0
+        self.frame[advance] = (self.frame[advance] + 1) % self.frame_count
+
+class Mob(pygame.sprite.Sprite):
+    # A view over one MobEngine slot. The engine owns position and behavior;
+    # the sprite holds the frames and masks used to draw and touch it. Mobs
+    # come from a MobPool, which calls reset() to put one on the map
+    def __init__(self, engine):
+        super().__init__()
+        self.stunned_color = (100, 100, 255)
+        # Every mob shares the same frames; stunned mobs draw a tinted copy
+        self.sheet = sprite_assets.acquire("enemy.png", (42, 48), 12, 1, (16, 24))
+        self.stunned_sheet = sprite_assets.acquire("enemy.png", (42, 48), 12, 1, (16, 24),
+                                                   tint=self.stunned_color)
+        self.engine = engine
+        self.slot = None
+        self.spawn_index = None
+
+    def reset(self, x, y, spawn_index=None):
+        self.slot = self.engine.add(self, x, y)
+        self.spawn_index = spawn_index
+
+    def unload(self):
+        sprite_assets.release(self.sheet)
+        sprite_assets.release(self.stunned_sheet)
+
+    @property
+    def rect(self):
+        return self.engine.rect(self.slot)
+
+    @property
+    def image(self):
+        sheet = self.stunned_sheet if self.engine.stunned[self.slot] else self.sheet
+        return sheet.frames[self.engine.frame[self.slot]]
+
+    @property
+    def mask(self):
+        # The tint leaves alpha alone, so both looks share one set of masks
+        return self.sheet.masks[self.engine.frame[self.slot]]
+
+    @property
+    def chasing(self):
+        return bool(self.engine.chasing[self.slot])
+
+    @property
+    def stunned(self):
+        return bool(self.engine.stunned[self.slot])
+
+    def interpolated_rect(self, alpha):
+        return self.engine.interpolated_rect(self.slot, alpha)
+
+    def kill(self):
+        super().kill()
+        if self.slot is not None:
+            self.engine.remove(self.slot)
+            self.slot = None
+
     def get_stunned(self, duration):
-        self.stunned = True
-        self.stun_timer = duration
-        self.speed = 0
-        for frame in self.frames:
-            frame.fill(self.stunned_color, special_flags=pygame.BLEND_MULT)
+        self.engine.stun(self.slot, duration)
+
+class MobPool:
+    # Every mob is built when the level starts, so a respawn in the middle
+    # of a chase never loads or slices a sprite sheet. Released mobs wait
+    # in the pool and go back on the map through Mob.reset()
+    def __init__(self, engine, size):
+        self.mobs = [Mob(engine) for _ in range(size)]
+        self.idle = list(self.mobs)
+
+    def acquire(self, x, y, spawn_index=None):
+        if not self.idle:
+            return None
+        mob = self.idle.pop()
+        mob.reset(x, y, spawn_index)
+        return mob
+
+    def release(self, mob):
+        mob.kill()
+        self.idle.append(mob)
+
+    def close(self):
+        # Take every mob off the map and give back their sprite sheets
+        for mob in self.mobs:
+            mob.kill()
+            mob.unload()
+        self.mobs = []
+        self.idle = []
+
+class SpawnAllocator:
+    # Spawn points split into free and taken. The free ones sit in a list
+    # and every point remembers its place there, so taking a point is a
+    # swap-remove and releasing it an append, both O(1)
+    def __init__(self, points):
+        self.points = points
+        self.free = list(range(len(points)))
+        self.place = list(range(len(points)))
+
+    def take(self, index):
+        place = self.place[index]
+        last = self.free[-1]
+        self.free[place] = last
+        self.place[last] = place
+        self.free.pop()
+        self.place[index] = -1
+
+    def release(self, index):
+        if self.place[index] < 0:
+            self.place[index] = len(self.free)
+            self.free.append(index)
+
+    def take_random(self, is_clear=None, tries=4):
+        # A random free point that is_clear accepts, or None. A few random
+        # picks usually find one; if they miss, every free point is checked
+        # once from a random start, so None means none of them is clear
+        for _ in range(min(tries, len(self.free))):
+            index = random.choice(self.free)
+            if is_clear is None or is_clear(self.points[index]):
+                self.take(index)
+                return index
+        if not self.free:
+            return None
+        start = random.randrange(len(self.free))
+        for i in range(len(self.free)):
+            index = self.free[(start + i) % len(self.free)]
+            if is_clear is None or is_clear(self.points[index]):
+                self.take(index)
+                return index
+        return None
 
 def show_win_screen():
     screen.fill(BLACK)
+    dirty_rects.mark_full()
     draw_text(screen, "YOU WIN!", 64, GREEN, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4)
     draw_text(screen, "Congratulations! You solved the puzzle!", 36, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
     draw_text(screen, "Press any key to exit", 36, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT * 3/4)
-    pygame.display.flip()
+    dirty_rects.present()
     
     waiting = True
     while waiting:
@@ -770,33 +2104,41 @@ def main():
     wheel_cipher = WheelCipher()
     suspicion_system = SuspicionSystem()
     camera = Camera(WORLD_WIDTH, WORLD_HEIGHT, zoom=3)
+
+    # Create walls from map objects. They never move, so they are merged and
+    # indexed once per map load
+    walls = WallGeometry.from_tmx(tmx_data, cell_size=tmx_data.tilewidth * 4)
+    if DEBUG:
+        print(walls.report())
+    sight = LineOfSight(walls.grid)
+    flow_field = FlowField(walls, (16, 24))
+    triggers = TriggerZones.from_tmx(tmx_data)
+
+    # Collect the MobSpawn points from the map where a mob is not stuck in a wall
+    mob_rect = pygame.Rect(0, 0, 16, 24)
+    spawn_points = [obj for obj in tmx_data.objects if obj.name == "MobSpawn"
+                    and walls.is_clear(mob_rect.move(obj.x - mob_rect.centerx, obj.y - mob_rect.centery))]
+
+    # Patrol routes between the spawns, the start and the interactables,
+    # cached next to the map
+    nav_points = [(obj.x, obj.y) for obj in spawn_points]
+    nav_points += [(obj.x, obj.y) for obj in tmx_data.objects if obj.name == "Start"]
+    nav_points += [interactable.rect.center for interactable in triggers.interactables]
+    nav = NavGraph.load_or_build(os.path.splitext(tmx_path)[0] + ".nav.npz", walls, nav_points, mob_rect.size)
+    if DEBUG:
+        print(nav.report())
+
+    tile_cache = TileCache(tmx_data)
+    tile_index = TileIndex(tmx_data)
+    map_renderer = MapRenderer(tmx_data, tile_cache, tile_index)
+    world_renderer = WorldRenderer(camera.zoom) if LOGICAL_RENDER else None
+    render_queue = RenderQueue()
     
     running = True
     while running:
         all_sprites = pygame.sprite.Group()
-        walls = pygame.sprite.Group()
-        signs = pygame.sprite.Group()
-
-        # Create walls from map objects
-        for obj in tmx_data.objects:
-            if obj.name == "Wall":
-                wall = Wall(obj.x, obj.y, obj.width, obj.height)
-                walls.add(wall)
-
-        sign1 = Sign(300, 200, 
-                    "Welcome to Lone Voyager! Press O to interact with signs.",
-                    "They're watching you! Be careful!")
-        sign2 = Sign(800, 400,
-                    "Press P to stun nearby enemies when they chase you!",
-                    "They're getting faster! Use your stun wisely!")
-        all_sprites.add(sign1)
-        all_sprites.add(sign2)
-        signs.add(sign1)
-        signs.add(sign2)
-
-        # Add the code terminal
-        terminal = CodeTerminal(2000, 500)
-        all_sprites.add(terminal)
+        # Add the signs and the code terminal from the map
+        all_sprites.add(triggers.interactables)
 
         start_x, start_y = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2
 
@@ -814,29 +2156,37 @@ def main():
         default_music.set_volume(1.0)
         
         # Spawns mob randomly at the given mobspawn object
-        # Collect all MobSpawn points from the map
-        spawn_points = [obj for obj in tmx_data.objects if obj.name == "MobSpawn"]
-
-        # Shuffle or sample from the list
         num_mobs_to_spawn = 7
-        chosen_spawns = random.sample(spawn_points, min(num_mobs_to_spawn, len(spawn_points)))
+        mobs = MobEngine(walls, mob_rect.size, lod=MobLOD(), nav=nav)
+        mob_pool = MobPool(mobs, num_mobs_to_spawn)
+        spawns = SpawnAllocator(spawn_points)
+
+        def spawn_is_clear(point):
+            # No mob is standing on the point
+            return not mobs.query_rect(mob_rect.move(point.x - mob_rect.centerx, point.y - mob_rect.centery))
+
+        def spawn_mob():
+            # False when every free spawn point is occupied; the mob stays
+            # in the pool and is retried on the next sim step
+            index = spawns.take_random(spawn_is_clear)
+            if index is None:
+                return False
+            point = spawn_points[index]
+            all_sprites.add(mob_pool.acquire(point.x, point.y, index))
+            return True
 
-        # Spawn mobs at selected locations
-        mobs = pygame.sprite.Group()
-        for spawn in chosen_spawns:
-            mob = Mob(spawn.x, spawn.y)
-            all_sprites.add(mob)
-            mobs.add(mob)
+        # Spawn mobs at random free spawn points
+        for _ in range(num_mobs_to_spawn):
+            spawn_mob()
 
 
         playing = True
         dt = 0
+        accumulator = 0
+        any_chasing = False
         chase_music_playing = False
         
         while playing:
-            # Update camera position
-            camera.update(player)
-
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     playing = False
@@ -866,23 +2216,57 @@ def main():
                         wheel_cipher.toggle()
                     elif wheel_cipher.visible and event.key == pygame.K_RETURN:
                         wheel_cipher.toggle()
-            
-            any_chasing = False
-            for mob in mobs:
-                mob.update(dt, player, walls)
-                if mob.chasing and not mob.stunned:
-                    any_chasing = True
-            
-            suspicion_system.update(dt, any_chasing)
-            suspicion_modifier = suspicion_system.get_suspicion_modifier()
-            for mob in mobs:
-                mob.update_speed(suspicion_modifier)
-            
-            if not wheel_cipher.visible:
-                player.update(dt, walls, signs, terminal, mobs, camera)
-            else:
+
+            if wheel_cipher.visible:
                 wheel_cipher.update()
 
+            # Run the simulation in fixed SIM_DT steps. Time that cannot be
+            # caught up within MAX_SIM_STEPS (slow frames, modal screens) is
+            # dropped rather than turned into one huge step
+            accumulator += dt
+            steps = 0
+            sight.begin_frame()
+            while accumulator >= SIM_DT and steps < MAX_SIM_STEPS:
+                player.store_previous()
+                mobs.store_previous()
+
+                # The flow field only needs to follow the player while someone
+                # is chasing
+                if any_chasing:
+                    flow_field.update(player.rect.center)
+
+                # Mobs move at the speed the suspicion level had after the
+                # previous step
+                mobs.tick(SIM_DT, player.rect.center, sight, flow_field,
+                          suspicion_system.get_suspicion_modifier(), camera.view_rect())
+                any_chasing = mobs.any_chasing()
+                
+                suspicion_system.update(SIM_DT, any_chasing)
+                
+                if not wheel_cipher.visible:
+                    player.update(SIM_DT, walls, triggers, mobs, camera)
+                
+                # Instead of game over, player collision with mob slows player down.
+                # Masks are only compared for mobs whose rects already overlap
+                collisions = [mob for mob in mobs.query_rect(player.rect)
+                              if pygame.sprite.collide_mask(player, mob)]
+                if collisions:
+                    player.slow_down()
+                    for mob in collisions:
+                        # The mob goes back to the pool and gives up its
+                        # spawn point, then respawns at a free one
+                        spawns.release(mob.spawn_index)
+                        mob_pool.release(mob)
+                # Respawn every pooled mob that can find a clear point,
+                # including ones that missed out on an earlier step
+                while mob_pool.idle and spawn_mob():
+                    pass
+
+                accumulator -= SIM_DT
+                steps += 1
+            accumulator = min(accumulator, SIM_DT)
+            alpha = accumulator / SIM_DT
+
             if any_chasing:
                 if not chase_music_playing:
                     default_music.stop()
@@ -894,60 +2278,50 @@ def main():
                     chase_music.stop()
                     default_music.play()
                     chase_music_playing = False
+
+            # Update camera position
+            camera.update(player, alpha)
             
-            # Instead of game over, player collision with mob slows player down
-            collisions = pygame.sprite.spritecollide(player, mobs, False)
-            if collisions:
-                player.slow_down()
-                for mob in collisions:
-                    mobs.remove(mob)
-                    all_sprites.remove(mob)
-
-                    # Pick new spawn point not in use
-                    used_positions = {(m.rect.x, m.rect.y) for m in mobs}
-                    available_spawns = [pt for pt in spawn_points if (pt.x, pt.y) not in used_positions]
-
-                    if available_spawns:
-                        new_spawn = random.choice(available_spawns)
-                        new_mob = Mob(new_spawn.x, new_spawn.y)
-                        mobs.add(new_mob)
-                        all_sprites.add(new_mob)
-            
-            screen.fill(BLACK)
-            draw_map(screen, tmx_data, camera, zoom=camera.zoom)
-            
+            if world_renderer:
+                # Draw the world at 1x, then upscale it once
+                world_surface = world_renderer.begin()
+                world_zoom = 1
+            else:
+                screen.fill(BLACK)
+                world_surface = screen
+                world_zoom = camera.zoom
+
+            map_renderer.draw(world_surface, camera, world_zoom)
+
             # Draw all sprites with camera offset
-            # Apply zoom scaling to sprite rendering
-            for entity in all_sprites:
-                scaled_image = pygame.transform.scale(
-                    entity.image,
-                    (int(entity.rect.width * camera.zoom), int(entity.rect.height * camera.zoom))
-                )
-                screen.blit(scaled_image, camera.apply(entity))
+            draw_sprites(world_surface, all_sprites, camera, world_zoom, render_queue, alpha)
 
+            if world_renderer:
+                world_renderer.present(screen)
+            # The world scrolls with the camera, so it always changes the whole frame
+            dirty_rects.mark_full()
 
-            
-            # Draw suspicion effects (screen space)
-            suspicion_system.draw_effects(screen)
-            
             # Draw wheel cipher (screen space)
             wheel_cipher.draw(screen, suspicion_system.suspicion)
 
             # Draw UI elements (screen space)
             if player.can_interact:
                 # Convert world position to screen position for interaction prompt
-                screen_pos = camera.apply_rect(player.rect).centerx, camera.apply_rect(player.rect).top - 20
+                player_rect = camera.apply_rect(player.interpolated_rect(alpha))
+                screen_pos = player_rect.centerx, player_rect.top - 20
                 if player.near_terminal:
                     draw_text(screen, "Press O to access terminal", 24, WHITE, *screen_pos)
                 else:
                     draw_text(screen, "Press O to read", 24, WHITE, *screen_pos)
 
+            # Draw suspicion effects (screen space), over the wheel cipher
             suspicion_system.draw_effects(screen)
             
             if player.stun_cooldown > 0:
                 cooldown_width = 200 * (1 - player.stun_cooldown / player.stun_cooldown_time)
                 pygame.draw.rect(screen, RED, (10, 10, cooldown_width, 20))
                 pygame.draw.rect(screen, WHITE, (10, 10, 200, 20), 2)
+                dirty_rects.mark(screen, (10, 10, 200, 20))
                 draw_text(screen, "Stun Cooldown", 20, WHITE, 110, 20)
             else:
                 draw_text(screen, "Press P to stun nearby enemies", 24, WHITE, SCREEN_WIDTH // 2, 30)
@@ -957,16 +2331,23 @@ def main():
             else:
                 draw_text(screen, "Press I to open cipher wheel", 24, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 30)
 
-            pygame.display.flip()
+            dirty_rects.present()
             dt = clock.tick(FPS) / 1000
         
         default_music.stop()
         if chase_music_playing:
             chase_music.stop()
+
+        # Give back this level's sprite sheets
+        mob_pool.close()
+        sprite_assets.release(player.sheet)
         
         if running:
             running = show_game_over_screen()
 
+    # The text cache counts the whole session, so it reports on the way out
+    if DEBUG:
+        print(text_cache.report())
     pygame.quit()
 
 if __name__ == "__main__":